@@ -0,0 +1,167 @@
+# Compact, parse-once representation of an analyzer payload used by the scorers
+import datetime
+import functools
+import itertools
+import math
+import operator
+from array import array
+from typing import Iterable, List, Optional
+
+# Interned tracker category codes; everything else maps to OTHER
+CATEGORY_OTHER = 0
+CATEGORY_ADVERTISING = 1
+CATEGORY_SOCIAL = 2
+CATEGORY_FINGERPRINTING = 3
+CATEGORY_CODES = {
+    "advertising": CATEGORY_ADVERTISING,
+    "social": CATEGORY_SOCIAL,
+    "fingerprinting invasive": CATEGORY_FINGERPRINTING,
+}
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# Expiry stored for session cookies; compares greater than every cutoff
+SESSION_COOKIE = math.inf
+
+_get_expires = operator.methodcaller("get", "expires")
+
+
+def normalize_expiry(exp) -> float:
+    """Cookie expiry in epoch seconds (analyzers report either s or ms); SESSION_COOKIE if unset"""
+    if not exp:
+        return SESSION_COOKIE
+    if exp > 1e12:  # milliseconds
+        exp /= 1000
+    return float(exp)
+
+
+def to_epoch_micros(seconds: float) -> int:
+    """Epoch seconds to integer microseconds, rounded exactly like datetime.utcfromtimestamp"""
+    frac, whole = math.modf(seconds)
+    return int(whole) * 1_000_000 + round(frac * 1e6)
+
+
+def datetime_to_epoch_micros(dt: datetime.datetime) -> int:
+    """Naive UTC datetime to integer microseconds since the epoch"""
+    return (dt - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def lifespan_days(expires: float, now_us: int) -> float:
+    """Remaining lifespan in days, computed exactly as (utcfromtimestamp(expires) - now).total_seconds() / 86400"""
+    return ((to_epoch_micros(expires) - now_us) / 10**6) / 86400
+
+
+@functools.lru_cache(maxsize=64)
+def expiry_cutoff(now: datetime.datetime, threshold_days: float) -> float:
+    """Largest expiry (epoch seconds) whose lifespan from `now` is within threshold_days
+
+    lifespan_days() is monotonic in the expiry, so "lifespan <= threshold" is
+    exactly "expiry <= cutoff" and cookies can be classified with one float
+    comparison instead of building a datetime each.
+    """
+    if threshold_days < 0:
+        return -math.inf  # max(lifespan, 0) can never be below a negative threshold
+    now_us = datetime_to_epoch_micros(now)
+    within = lambda exp: lifespan_days(exp, now_us) <= threshold_days
+    # Bracket the boundary around the estimate, then bisect down to adjacent floats
+    lo = hi = now_us / 1e6 + threshold_days * 86400
+    step = 1e-6
+    while not within(lo):
+        lo -= step
+        step *= 2
+    step = 1e-6
+    while within(hi):
+        hi += step
+        step *= 2
+    while True:
+        mid = lo + (hi - lo) / 2
+        if mid <= lo or mid >= hi:
+            return lo
+        if within(mid):
+            lo = mid
+        else:
+            hi = mid
+
+
+class CookieTable:
+    """Normalized cookie expiries as a flat float array; raw records are kept only for reports"""
+
+    __slots__ = ("expires", "_sources")
+
+    def __init__(self, expires: array, sources: tuple = ()):
+        self.expires = expires
+        self._sources = sources
+
+    @classmethod
+    def from_cookies(cls, *cookie_lists: Iterable[dict]) -> "CookieTable":
+        expires = array("d")
+        for cookies in cookie_lists:
+            # normalize_expiry, inlined: this runs once per cookie on every page
+            expires.extend([
+                (exp / 1000 if exp > 1e12 else exp) if exp else SESSION_COOKIE
+                for exp in map(_get_expires, cookies)
+            ])
+        return cls(expires, cookie_lists)
+
+    def __len__(self) -> int:
+        return len(self.expires)
+
+    def records(self) -> Iterable[dict]:
+        """The original cookie dicts, in table order"""
+        return itertools.chain.from_iterable(self._sources)
+
+    def count_within(self, now: datetime.datetime, threshold_days: float) -> int:
+        """Number of cookies (excluding session cookies) living at most threshold_days from now"""
+        cutoff = expiry_cutoff(now, threshold_days)
+        return sum(1 for exp in self.expires if exp <= cutoff)
+
+    def lifespans(self, now: datetime.datetime) -> List[Optional[float]]:
+        """Remaining lifespan per cookie in days, None for session cookies"""
+        now_us = datetime_to_epoch_micros(now)
+        return [None if exp == SESSION_COOKIE else lifespan_days(exp, now_us) for exp in self.expires]
+
+
+class ParsedAnalysis:
+    """Everything the privacy scorers need from an analyzer payload, extracted in one pass"""
+
+    __slots__ = (
+        "banner_exists", "banner_clarity", "banner_manipulative",
+        "has_accept", "has_reject", "has_manage",
+        "before_summary_total", "after_summary_total",
+        "before_uncategorized", "after_uncategorized",
+        "request_count", "tracker_counts", "breach_count", "cookies",
+    )
+
+    @classmethod
+    def parse(cls, data: dict) -> "ParsedAnalysis":
+        self = cls()
+        banner = data.get("banner_analysis", {})
+        quality = banner.get("consent_banner_quality", {})
+        buttons = banner.get("granular_controls", {})
+        self.banner_exists = bool(banner.get("consent_banner_existance", {}).get("exists", False))
+        self.banner_clarity = bool(quality.get("language_clarity", False))
+        self.banner_manipulative = bool(quality.get("manipulative_wording", False))
+        self.has_accept = bool(buttons.get("accept_all_button_presence", False))
+        self.has_reject = bool(buttons.get("reject_all_button_presence", False))
+        self.has_manage = bool(buttons.get("manage_preferences_button_presence", False))
+
+        before = data.get("before_consent", {})
+        after = data.get("after_consent", {})
+        before_summary = before.get("cookie_category_summary", {})
+        after_summary = after.get("cookie_category_summary", {})
+        self.before_summary_total = sum(before_summary.values())
+        self.after_summary_total = sum(after_summary.values())
+        self.before_uncategorized = before_summary.get("uncategorized", 0)
+        self.after_uncategorized = after_summary.get("uncategorized", 0)
+
+        # One pass over the requests, counting interned tracker categories
+        requests = data.get("network_requests", [])
+        counts = [0, 0, 0, 0]
+        for req in requests:
+            counts[CATEGORY_CODES.get(req.get("_tracker", {}).get("category", "").lower(), CATEGORY_OTHER)] += 1
+        self.request_count = len(requests)
+        self.tracker_counts = tuple(counts)
+
+        self.breach_count = len(data.get("breach_data", []))
+        self.cookies = CookieTable.from_cookies(before.get("cookies", []), after.get("cookies", []))
+        return self
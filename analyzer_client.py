@@ -0,0 +1,106 @@
+# Async upstream client for the cookie analyzer service
+import asyncio
+from typing import Optional
+
+import httpx
+
+from circuit_breaker import CircuitBreaker
+
+
+class AnalyzerClient:
+    """Pooled, concurrency-limited async client for the /analyze_cookies endpoint"""
+
+    def __init__(self, endpoint: str, max_concurrency: int = 8,
+                 connect_timeout: float = 5.0, read_timeout: float = 300.0,
+                 keepalive_expiry: float = 30.0, breaker: Optional[CircuitBreaker] = None):
+        self.endpoint = endpoint
+        self.max_concurrency = max_concurrency
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.keepalive_expiry = keepalive_expiry
+        self._client: Optional[httpx.AsyncClient] = None
+        # Caps in-flight analyzer calls; extra misses wait here without blocking the loop
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # Trips on network errors and 5xx only; 4xx responses are about the URL, not the analyzer's health
+        self.breaker = breaker
+
+    @property
+    def in_flight(self) -> int:
+        """Number of analyzer calls currently holding a concurrency slot"""
+        return self.max_concurrency - self._semaphore._value
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Create the pooled HTTP client on first use"""
+        if self._client is None:
+            limits = httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+                keepalive_expiry=self.keepalive_expiry,
+            )
+            timeout = httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+            self._client = httpx.AsyncClient(limits=limits, timeout=timeout)
+        return self._client
+
+    async def close(self):
+        """Close pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _record(self, healthy: bool):
+        if self.breaker is not None:
+            if healthy:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+    async def analyze(self, url: str) -> dict:
+        """POST the URL to the analyzer and return a result envelope"""
+        client = self._get_client()
+        try:
+            async with self._semaphore:
+                if self.breaker is not None and not self.breaker.allow():
+                    return {
+                        "success": False,
+                        "error": "Analyzer circuit open, failing fast",
+                        "status_code": 503,
+                        "circuit_open": True,
+                        "retry_after": self.breaker.retry_after(),
+                    }
+                try:
+                    response = await client.post(self.endpoint, json={"url": url})
+                except httpx.HTTPError:
+                    self._record(False)
+                    raise
+                except BaseException:
+                    if self.breaker is not None:
+                        self.breaker.record_abandoned()
+                    raise
+                self._record(response.status_code < 500)
+            response.raise_for_status()
+
+            # Try to parse as JSON, otherwise return text
+            try:
+                data = response.json()
+            except ValueError:
+                data = {"text_response": response.text, "status_code": response.status_code}
+
+            return {
+                "success": True,
+                "data": data,
+                "status_code": response.status_code,
+                "headers": dict(response.headers),
+                "size": len(response.content),  # lets callers size the payload without re-encoding it
+            }
+        except httpx.HTTPStatusError as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "status_code": e.response.status_code
+            }
+        except httpx.HTTPError as e:
+            return {
+                "success": False,
+                "error": str(e) or type(e).__name__,
+                "status_code": None
+            }
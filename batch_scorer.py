@@ -0,0 +1,134 @@
+# Vectorized multi-document scoring for PrivacyComplianceScorer (needs numpy, an optional extra used by rescore_cache.py)
+import datetime
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from analysis_model import (
+    CATEGORY_ADVERTISING,
+    CATEGORY_FINGERPRINTING,
+    CATEGORY_SOCIAL,
+    ParsedAnalysis,
+    expiry_cutoff,
+)
+from privacy_compliance_scorer import EXPIRY_THRESHOLD_DAYS, SCORE_WEIGHTS, SCORER_VERSION
+
+
+class ColumnarBatch:
+    """Parsed analyzer payloads laid out as per-document and per-cookie NumPy columns"""
+
+    def __init__(self, analyses: List[ParsedAnalysis]):
+        n = len(analyses)
+        self.size = n
+
+        # Per-document banner flags and summary counts
+        self.banner_exists = np.fromiter((a.banner_exists for a in analyses), dtype=bool, count=n)
+        self.banner_clarity = np.fromiter((a.banner_clarity for a in analyses), dtype=bool, count=n)
+        self.banner_manipulative = np.fromiter((a.banner_manipulative for a in analyses), dtype=bool, count=n)
+        self.button_count = np.fromiter(
+            (a.has_accept + a.has_reject + a.has_manage for a in analyses), dtype=np.int8, count=n)
+        self.before_total = np.fromiter((a.before_summary_total for a in analyses), dtype=np.float64, count=n)
+        self.after_total = np.fromiter((a.after_summary_total for a in analyses), dtype=np.float64, count=n)
+        self.before_uncategorized = np.fromiter((a.before_uncategorized for a in analyses), dtype=np.float64, count=n)
+        self.after_uncategorized = np.fromiter((a.after_uncategorized for a in analyses), dtype=np.float64, count=n)
+        self.breach_count = np.fromiter((a.breach_count for a in analyses), dtype=np.int64, count=n)
+        self.request_count = np.fromiter((a.request_count for a in analyses), dtype=np.int64, count=n)
+        self.tracker_counts = np.array([a.tracker_counts for a in analyses], dtype=np.int64).reshape(n, 4)
+        self.cookie_count = np.fromiter((len(a.cookies) for a in analyses), dtype=np.int64, count=n)
+
+        # Per-cookie columns, tagged with the index of the document they belong to.
+        # Only cookies with an expiry are kept; the rest only matter through cookie_count
+        expires = np.concatenate(
+            [np.frombuffer(a.cookies.expires, dtype=np.float64) for a in analyses]
+        ) if n else np.zeros(0)
+        cookie_doc = np.repeat(np.arange(n), self.cookie_count)
+        has_expiry = np.isfinite(expires)  # session cookies are stored as +inf
+        self.cookie_doc = cookie_doc[has_expiry]
+        self.cookie_expires = expires[has_expiry]
+
+
+def _banner_scores(batch: ColumnarBatch, pre_consent_cookies_fire: np.ndarray) -> np.ndarray:
+    """Vectorized PrivacyComplianceScorer.calculate_banner_quality"""
+    score = np.where(batch.banner_exists, 0.50, -1.0)
+    score = np.where(batch.banner_clarity, score + 0.25, score)
+    score = np.where(batch.banner_manipulative, score - 0.10, score)
+    score = np.select(
+        [batch.button_count == 3, batch.button_count > 0],
+        [score + 0.25, score + 0.10],
+        score - 0.25,
+    )
+    score = np.maximum(np.minimum(score, 1.0), 0.0)
+    return np.where(pre_consent_cookies_fire & (score > 0.75), 0.75, score)
+
+
+def _tracking_scores(batch: ColumnarBatch) -> np.ndarray:
+    """Vectorized tracker-ratio score (fingerprinting requests count twice)"""
+    counts = batch.tracker_counts
+    tracker_total = counts[:, CATEGORY_ADVERTISING] + counts[:, CATEGORY_SOCIAL] + counts[:, CATEGORY_FINGERPRINTING]
+    weighted = tracker_total + counts[:, CATEGORY_FINGERPRINTING]
+    has_trackers = (batch.request_count > 0) & (tracker_total > 0)
+    ratio = np.divide(weighted, batch.request_count, out=np.zeros(batch.size), where=has_trackers)
+    return np.where(has_trackers, 1.0 - ratio, 1.0)
+
+
+def _short_lived_counts(batch: ColumnarBatch, now: datetime.datetime, threshold_days: float) -> np.ndarray:
+    """Per-document number of cookies whose remaining lifespan is within threshold_days"""
+    short_lived = batch.cookie_expires <= expiry_cutoff(now, threshold_days)
+    return np.bincount(batch.cookie_doc, weights=short_lived, minlength=batch.size)
+
+
+def score_batch(payloads: Iterable[dict], now: Optional[datetime.datetime] = None,
+                threshold_days: float = EXPIRY_THRESHOLD_DAYS) -> List[dict]:
+    """Score many analyzer payloads at once
+
+    Returns one dict per payload with the same privacy_score, score_breakdown
+    and scorer_version that PrivacyComplianceScorer(data, now=now).calculate_score()
+    would produce. Unlike the per-document scorer, payload metadata is not modified.
+    """
+    analyses = [ParsedAnalysis.parse(data or {}) for data in payloads]
+    if not analyses:
+        return []
+    now = now or datetime.datetime.utcnow()
+    batch = ColumnarBatch(analyses)
+
+    pre_consent_cookies_fire = (batch.before_total == batch.after_total) & (batch.before_total > 0)
+    consent = _banner_scores(batch, pre_consent_cookies_fire)
+
+    non_first_party_before = batch.before_total - batch.after_uncategorized
+    non_first_party_after = batch.before_total - batch.before_uncategorized
+    cookies_equal = non_first_party_before == non_first_party_after
+
+    tracking = _tracking_scores(batch)
+    breach = np.maximum(1.0 - 0.1 * batch.breach_count, 0.0)
+    short_lived = _short_lived_counts(batch, now, threshold_days)
+
+    # Python's round() is used for the final values so results match the scalar scorer bit for bit
+    expiry = np.array([
+        round(int(short) / int(total), 2) if total else 1.0
+        for short, total in zip(short_lived, batch.cookie_count)
+    ])
+    cookies = np.where(cookies_equal, 1.0, 0.9)
+
+    weights = SCORE_WEIGHTS
+    combined = (
+        consent  * weights["consent"] +
+        cookies  * weights["cookies"] +
+        tracking * weights["tracking"] +
+        breach   * weights["breach"] +
+        expiry   * weights["expiry"]
+    )
+
+    results = []
+    for i in range(batch.size):
+        results.append({
+            "privacy_score": round(float(combined[i]) * 100, 2),
+            "score_breakdown": {
+                "consent":  float(consent[i]),
+                "cookies":  1 if cookies_equal[i] else 0.9,
+                "tracking": float(tracking[i]),
+                "breach":   float(breach[i]),
+                "expiry":   float(expiry[i]),
+            },
+            "scorer_version": SCORER_VERSION,
+        })
+    return results
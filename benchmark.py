@@ -0,0 +1,452 @@
+# Load-test and benchmark suite for the cache service
+#
+# Starts the FastAPI app in a subprocess against a local storage backend
+# (memory or sqlite) and a stub /analyze_cookies server with configurable
+# latency, replays seeded Zipf-distributed traffic and reports throughput and
+# p50/p95/p99 latency per endpoint. Also micro-benchmarks the scorers on
+# synthetic payloads. Results are written as JSON so runs can be compared
+# across commits.
+#
+#   python benchmark.py                              # service scenarios + scorer microbenchmarks
+#   python benchmark.py service --scenarios burst --analyzer-latency-ms 200
+#   python benchmark.py scorer --output scorer.json
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+
+# Synthetic page sizes: (network requests, cookies per consent phase, breaches)
+PAYLOAD_SIZES = {
+    "small": (20, 5, 0),
+    "medium": (300, 40, 2),
+    "large": (3000, 250, 5),
+    "huge": (5000, 4000, 5),  # 10k cookies once the after-consent extras are added
+}
+
+TRACKER_CATEGORIES = ["advertising", "social", "fingerprinting invasive", "analytics", None]
+
+# Share of requests per endpoint in the hit-heavy and miss-heavy scenarios
+ENDPOINT_MIX = [
+    ("fetch_full", 0.55),
+    ("fetch_summary", 0.10),
+    ("fetch_score", 0.25),
+    ("fetch_batch", 0.05),
+    ("cache_stats", 0.03),
+    ("health", 0.02),
+]
+
+SCENARIOS = ("hit-heavy", "miss-heavy", "burst")
+
+
+def make_payload(size: str, rng: random.Random, now: float = None) -> dict:
+    """Analyzer-shaped payload with the request/cookie counts of a PAYLOAD_SIZES entry"""
+    n_requests, n_cookies, n_breaches = PAYLOAD_SIZES[size]
+    now = now or time.time()
+
+    def cookie(i):
+        expires = rng.choice([0, now + rng.uniform(-86400, 400 * 86400)])
+        if rng.random() < 0.3 and expires:
+            expires *= 1000  # some analyzers report milliseconds
+        return {"name": f"c{i}", "domain": f"site{rng.randint(0, 9)}.example", "expires": expires}
+
+    def request(i):
+        req = {"url": f"https://cdn{rng.randint(0, 50)}.example/r/{i}", "method": "GET"}
+        category = rng.choice(TRACKER_CATEGORIES)
+        if category:
+            req["_tracker"] = {"category": category, "name": f"tracker{rng.randint(0, 20)}"}
+        return req
+
+    before = [cookie(i) for i in range(n_cookies)]
+    after = before + [cookie(n_cookies + i) for i in range(n_cookies // 2)]
+    return {
+        "metadata": {"generated": True},
+        "banner_analysis": {
+            "consent_banner_existance": {"exists": rng.random() < 0.8},
+            "consent_banner_quality": {
+                "language_clarity": rng.random() < 0.6,
+                "manipulative_wording": rng.random() < 0.2,
+            },
+            "granular_controls": {
+                "accept_all_button_presence": True,
+                "reject_all_button_presence": rng.random() < 0.5,
+                "manage_preferences_button_presence": rng.random() < 0.5,
+            },
+        },
+        "before_consent": {
+            "cookie_category_summary": {"necessary": n_cookies // 2, "uncategorized": n_cookies - n_cookies // 2},
+            "cookies": before,
+        },
+        "after_consent": {
+            "cookie_category_summary": {"necessary": len(after) // 2, "uncategorized": len(after) - len(after) // 2},
+            "cookies": after,
+        },
+        "network_requests": [request(i) for i in range(n_requests)],
+        "breach_data": [{"name": f"breach{i}"} for i in range(n_breaches)],
+    }
+
+
+def create_stub_app(latency_ms: float, jitter_ms: float, payload_size: str):
+    """Stand-in for the cookie analyzer: sleeps, then returns a payload seeded by the URL"""
+    from fastapi import FastAPI
+
+    stub = FastAPI()
+    calls = {"count": 0}
+
+    @stub.post("/analyze_cookies")
+    async def analyze_cookies(body: dict):
+        calls["count"] += 1
+        rng = random.Random(body.get("url"))
+        await asyncio.sleep(max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000)
+        payload = make_payload(payload_size, rng)
+        payload["metadata"]["url"] = body.get("url")
+        return payload
+
+    @stub.get("/calls")
+    async def call_count():
+        return calls
+
+    return stub
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples, elapsed):
+    """Throughput and latency percentiles (ms) per endpoint label"""
+    by_label = {}
+    for label, latency, ok in samples:
+        by_label.setdefault(label, []).append((latency, ok))
+    summary = {}
+    for label, entries in sorted(by_label.items()):
+        latencies = sorted(latency * 1000 for latency, _ in entries)
+        summary[label] = {
+            "requests": len(entries),
+            "errors": sum(1 for _, ok in entries if not ok),
+            "throughput_rps": round(len(entries) / elapsed, 1) if elapsed else None,
+            "mean_ms": round(sum(latencies) / len(latencies), 2),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+        }
+    return summary
+
+
+class ZipfUrls:
+    """Seeded Zipf(s) sampler over a fixed universe of URLs (rank 1 is the most popular)"""
+
+    def __init__(self, universe: int, s: float, rng: random.Random, prefix: str):
+        self.urls = [f"https://{prefix}-{rank}.example/page" for rank in range(1, universe + 1)]
+        weights = [1 / rank ** s for rank in range(1, universe + 1)]
+        total = 0.0
+        self.cum_weights = []
+        for weight in weights:
+            total += weight
+            self.cum_weights.append(total)
+        self.rng = rng
+
+    def sample(self, k: int = 1):
+        return self.rng.choices(self.urls, cum_weights=self.cum_weights, k=k)
+
+
+async def timed(client: httpx.AsyncClient, samples: list, label: str, method: str, path: str, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, path, **kwargs)
+        ok = response.status_code < 400
+    except httpx.HTTPError:
+        ok = False
+    samples.append((label, time.perf_counter() - started, ok))
+
+
+def plan_requests(args, rng: random.Random, zipf: ZipfUrls, new_url_ratio: float, run_id: str):
+    """Deterministic list of (label, method, path, kwargs) for a scenario"""
+    labels = [label for label, _ in ENDPOINT_MIX]
+    weights = [weight for _, weight in ENDPOINT_MIX]
+    plan = []
+    for i in range(args.requests):
+        label = rng.choices(labels, weights=weights)[0]
+        if rng.random() < new_url_ratio:
+            url = f"https://new-{run_id}-{i}.example/page"
+        else:
+            url = zipf.sample()[0]
+        if label.startswith("fetch_") and label != "fetch_batch":
+            view = label.split("_", 1)[1]
+            plan.append((label, "GET", "/api/fetch", {"params": {"url": url, "view": view}}))
+        elif label == "fetch_batch":
+            urls = zipf.sample(args.batch_size)
+            plan.append((label, "POST", "/api/fetch/batch", {"json": {"urls": urls, "view": "score"}}))
+        elif label == "cache_stats":
+            plan.append((label, "GET", "/api/cache/stats", {}))
+        else:
+            plan.append((label, "GET", "/health", {}))
+    return plan
+
+
+async def run_plan(client, plan, concurrency):
+    """Replay a plan with a fixed number of concurrent clients; returns (samples, elapsed)"""
+    samples = []
+    queue = iter(plan)
+
+    async def worker():
+        for label, method, path, kwargs in queue:
+            await timed(client, samples, label, method, path, **kwargs)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - started
+
+
+async def run_burst(client, args, rng, run_id):
+    """Waves of simultaneous requests for one cold URL each (exercises miss coalescing)"""
+    samples = []
+    waves = max(1, args.requests // args.burst_size)
+    started = time.perf_counter()
+    for wave in range(waves):
+        url = f"https://burst-{run_id}-{wave}.example/page"
+        view = rng.choice(["full", "score"])
+        await asyncio.gather(*(
+            timed(client, samples, f"fetch_{view}_burst", "GET", "/api/fetch", params={"url": url, "view": view})
+            for _ in range(args.burst_size)
+        ))
+    return samples, time.perf_counter() - started
+
+
+async def analyzer_calls(stub_client):
+    return (await stub_client.get("/calls")).json()["count"]
+
+
+async def warm_cache(client, urls, batch_size=100):
+    for start in range(0, len(urls), batch_size):
+        await client.post("/api/fetch/batch", json={"urls": urls[start:start + batch_size], "view": "score"})
+
+
+async def wait_until_ready(client, path, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get(path)).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {path}")
+
+
+@contextlib.contextmanager
+def start_servers(args):
+    """Run the stub analyzer and the cache service as subprocesses; yields their base URLs"""
+    stub_port, app_port = free_port(), free_port()
+    workdir = tempfile.mkdtemp(prefix="url-cache-bench-")
+    env = {
+        **os.environ,
+        "STORAGE_BACKEND": args.storage,
+        "SQLITE_PATH": os.path.join(workdir, "bench.sqlite3"),
+        "ANALYZER_ENDPOINT": f"http://127.0.0.1:{stub_port}/analyze_cookies",
+        "ANALYZER_MAX_CONCURRENCY": str(args.analyzer_concurrency),
+        "MONGO_CONNECT_RETRY_INITIAL": "0.1",
+    }
+    log = open(os.path.join(workdir, "servers.log"), "w")
+    here = os.path.dirname(os.path.abspath(__file__))
+    stub = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "stub-analyzer", "--port", str(stub_port),
+         "--analyzer-latency-ms", str(args.analyzer_latency_ms), "--analyzer-jitter-ms", str(args.analyzer_jitter_ms),
+         "--payload-size", args.payload_size],
+        env=env, stdout=log, stderr=subprocess.STDOUT, cwd=here,
+    )
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "url_cache_app_atlas:app", "--port", str(app_port),
+         "--log-level", "warning", "--no-access-log"],
+        env=env, stdout=log, stderr=subprocess.STDOUT, cwd=here,
+    )
+    try:
+        yield f"http://127.0.0.1:{stub_port}", f"http://127.0.0.1:{app_port}"
+    finally:
+        for proc in (app, stub):
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        log.close()
+        print(f"🗒️  Server logs: {log.name}")
+
+
+async def bench_service(args) -> dict:
+    rng = random.Random(args.seed)
+    run_id = f"{args.seed}-{int(time.time())}"
+    results = {}
+    limits = httpx.Limits(max_connections=max(args.concurrency, args.burst_size))
+    with start_servers(args) as (stub_url, app_url):
+        async with httpx.AsyncClient(base_url=app_url, timeout=120, limits=limits) as client, \
+                httpx.AsyncClient(base_url=stub_url, timeout=10) as stub_client:
+            await wait_until_ready(stub_client, "/calls")
+            await wait_until_ready(client, "/health/ready")
+            for scenario in args.scenarios:
+                await client.delete("/api/cache/clear")
+                zipf = ZipfUrls(args.universe, args.zipf_s, rng, prefix=f"{scenario}-{run_id}")
+                if scenario == "hit-heavy":
+                    await warm_cache(client, zipf.urls)
+                calls_before = await analyzer_calls(stub_client)
+                print(f"🏁 {scenario}: {args.requests} requests, concurrency {args.concurrency}")
+                if scenario == "burst":
+                    samples, elapsed = await run_burst(client, args, rng, run_id)
+                else:
+                    new_url_ratio = 0.0 if scenario == "hit-heavy" else args.miss_ratio
+                    plan = plan_requests(args, rng, zipf, new_url_ratio, f"{scenario}-{run_id}")
+                    samples, elapsed = await run_plan(client, plan, args.concurrency)
+                results[scenario] = {
+                    "elapsed_seconds": round(elapsed, 3),
+                    "throughput_rps": round(len(samples) / elapsed, 1),
+                    "analyzer_calls": await analyzer_calls(stub_client) - calls_before,
+                    "endpoints": summarize(samples, elapsed),
+                }
+                print_service_results(scenario, results[scenario])
+    return results
+
+
+def print_service_results(scenario, result):
+    print(f"   {result['throughput_rps']} req/s overall, {result['analyzer_calls']} analyzer calls")
+    for label, stats in result["endpoints"].items():
+        print(f"   {label:<20} n={stats['requests']:<6} err={stats['errors']:<4} "
+              f"p50={stats['p50_ms']:>8.2f}ms p95={stats['p95_ms']:>8.2f}ms p99={stats['p99_ms']:>8.2f}ms")
+
+
+def time_call(fn, repeat, number):
+    """Best-of-`repeat` mean seconds per call over `number` calls"""
+    best = math.inf
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+def bench_scorer(args) -> dict:
+    from privacy_compliance_scorer import PrivacyComplianceScorer
+    try:
+        from batch_scorer import score_batch
+    except ImportError:
+        score_batch = None
+        print("⚠️  numpy not installed, skipping score_batch")
+
+    rng = random.Random(args.seed)
+    results = {}
+    for size in PAYLOAD_SIZES:
+        payloads = [make_payload(size, rng) for _ in range(args.scorer_batch)]
+        number = max(1, args.scorer_iterations // {"large": 10, "huge": 100}.get(size, 1))
+        per_doc = time_call(lambda: PrivacyComplianceScorer(payloads[0]).calculate_score(), args.scorer_repeat, number)
+        results[size] = {
+            "network_requests": PAYLOAD_SIZES[size][0],
+            "cookies": len(payloads[0]["before_consent"]["cookies"]) + len(payloads[0]["after_consent"]["cookies"]),
+            "calculate_score_us": round(per_doc * 1e6, 2),
+        }
+        line = f"🧮 {size:<7} calculate_score {results[size]['calculate_score_us']:>10.2f}µs"
+        if score_batch is not None:
+            batch = time_call(lambda: score_batch(payloads), args.scorer_repeat, max(1, number // args.scorer_batch))
+            results[size]["score_batch_us_per_doc"] = round(batch / args.scorer_batch * 1e6, 2)
+            line += f"   score_batch {results[size]['score_batch_us_per_doc']:>10.2f}µs/doc"
+        print(line)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def write_results(args, results):
+    output = args.output or os.path.join("benchmark_results", f"{datetime.utcnow():%Y%m%dT%H%M%SZ}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k != "command"},
+        },
+        **results,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Results written to {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the URL cache service and the privacy scorers")
+    parser.add_argument("command", nargs="?", default="all", choices=["all", "service", "scorer", "stub-analyzer"])
+    parser.add_argument("--seed", type=int, default=42, help="seed for traffic and payload generation")
+    parser.add_argument("--output", help="JSON results path (default benchmark_results/<timestamp>.json)")
+
+    service = parser.add_argument_group("service load test")
+    service.add_argument("--scenarios", type=lambda s: s.split(","), default=list(SCENARIOS),
+                         help=f"comma-separated subset of {','.join(SCENARIOS)}")
+    service.add_argument("--storage", default="memory", choices=["memory", "sqlite"], help="storage stand-in")
+    service.add_argument("--requests", type=int, default=2000, help="requests per scenario")
+    service.add_argument("--concurrency", type=int, default=32, help="concurrent clients")
+    service.add_argument("--universe", type=int, default=500, help="distinct URLs in the Zipf universe")
+    service.add_argument("--zipf-s", type=float, default=1.1, help="Zipf exponent (higher = more skewed)")
+    service.add_argument("--miss-ratio", type=float, default=0.8, help="share of never-seen URLs in miss-heavy")
+    service.add_argument("--burst-size", type=int, default=50, help="simultaneous requests per burst wave")
+    service.add_argument("--batch-size", type=int, default=10, help="URLs per /api/fetch/batch request")
+    service.add_argument("--analyzer-latency-ms", type=float, default=50, help="stub analyzer latency")
+    service.add_argument("--analyzer-jitter-ms", type=float, default=10, help="uniform +/- jitter on that latency")
+    service.add_argument("--analyzer-concurrency", type=int, default=32, help="ANALYZER_MAX_CONCURRENCY for the app")
+    service.add_argument("--payload-size", default="medium", choices=list(PAYLOAD_SIZES),
+                         help="size of the stub analyzer's payloads")
+    service.add_argument("--port", type=int, help=argparse.SUPPRESS)
+
+    scorer = parser.add_argument_group("scorer microbenchmarks")
+    scorer.add_argument("--scorer-iterations", type=int, default=200, help="calls per timing run")
+    scorer.add_argument("--scorer-repeat", type=int, default=5, help="timing runs (best is kept)")
+    scorer.add_argument("--scorer-batch", type=int, default=100, help="payloads per score_batch call")
+    args = parser.parse_args()
+
+    if args.command == "stub-analyzer":
+        import uvicorn
+        stub = create_stub_app(args.analyzer_latency_ms, args.analyzer_jitter_ms, args.payload_size)
+        uvicorn.run(stub, host="127.0.0.1", port=args.port, log_level="warning", access_log=False)
+        return
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = {}
+    if args.command in ("all", "scorer"):
+        results["scorer"] = bench_scorer(args)
+    if args.command in ("all", "service"):
+        results["service"] = asyncio.run(bench_service(args))
+    write_results(args, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,556 @@
+# Storage backends for cached analyses: MongoDB Atlas, a local SQLite file and process memory
+import asyncio
+import os
+import sqlite3
+import threading
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+import orjson
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReplaceOne, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from memory_cache import estimate_size
+from storage_codec import BLOB_FIELD
+
+# Cache generation a document was written in; documents without it belong to generation 0
+GENERATION_FIELD = "generation"
+
+
+def project(document: dict, projection: Optional[dict]) -> dict:
+    """Apply a MongoDB-style projection to a document held in memory
+
+    Supports the two forms the service uses: inclusion of top-level fields
+    (_id is always kept) and exclusion of top-level or dotted fields.
+    """
+    if not projection:
+        return dict(document)
+    if all(projection.values()):
+        return {key: value for key, value in document.items() if key == "_id" or key in projection}
+    projected = dict(document)
+    for path in projection:
+        *parents, leaf = path.split(".")
+        target = projected
+        for key in parents:
+            if not isinstance(target.get(key), dict):
+                break
+            # Copy on the way down so the stored document is left untouched
+            target[key] = target = dict(target[key])
+        else:
+            target.pop(leaf, None)
+    return projected
+
+
+def needs_field(projection: Optional[dict], field: str) -> bool:
+    """Whether a projection keeps any part of a top-level field"""
+    if not projection:
+        return True
+    if all(projection.values()):
+        return field in projection
+    return projection.get(field, 1) != 0
+
+
+class CacheStorage:
+    """Interface shared by the cache backends
+
+    Documents are dicts keyed by "_id". Reads take MongoDB-style projections
+    so backends can skip loading fields the caller does not need, and batch
+    reads and writes go through find_many / bulk_replace so each backend can
+    use its own round-trip-saving primitive.
+
+    Invalidation is logical: the store keeps a generation counter and reads
+    skip documents written in an earlier generation, so clearing the cache
+    is one counter bump. purge_generations() removes the invisible
+    documents later, a batch at a time.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.connected = False
+        # Concurrent inserts of the same key that lost the race (the winner's copy is kept)
+        self.duplicate_key_races = 0
+        # Current cache generation as last read from (or bumped in) the store
+        self.generation = 0
+
+    async def connect(self):
+        """Make one connection attempt; raises if the store is unreachable
+
+        Does not set connected: the caller does that once its own setup
+        (generation, indexes) has succeeded on the new connection.
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        self.connected = False
+
+    async def ping(self):
+        """Cheapest round trip to the store; raises if it is unhealthy"""
+        raise NotImplementedError
+
+    async def server_info(self) -> dict:
+        """Engine name and version"""
+        raise NotImplementedError
+
+    async def stats(self) -> dict:
+        """dbStats-style sizes: dataSize, storageSize (bytes), objects, indexes"""
+        raise NotImplementedError
+
+    async def ensure_indexes(self):
+        """Create secondary indexes (no-op if they already exist)"""
+
+    async def find_one(self, key: str, projection: Optional[dict] = None) -> Optional[dict]:
+        raise NotImplementedError
+
+    def find_many(self, keys: List[str], projection: Optional[dict] = None) -> AsyncIterator[dict]:
+        """Documents for the keys that exist, in no particular order, in one round trip where possible"""
+        raise NotImplementedError
+
+    async def replace(self, document: dict):
+        """Insert or replace a document by its _id"""
+        raise NotImplementedError
+
+    async def bulk_replace(self, documents: List[dict]) -> Dict[str, str]:
+        """Upsert many documents at once; returns _id -> error for the ones that failed"""
+        raise NotImplementedError
+
+    async def update_fields(self, key: str, fields: dict):
+        """Set top-level fields on an existing document"""
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    async def load_generation(self) -> int:
+        """Read the current generation from the store (other workers may have bumped it)"""
+        raise NotImplementedError
+
+    async def bump_generation(self) -> int:
+        """Atomically start a new generation, invalidating every stored document; returns it"""
+        raise NotImplementedError
+
+    async def purge_generations(self, limit: int) -> int:
+        """Delete up to limit documents from earlier generations; returns how many were removed"""
+        raise NotImplementedError
+
+    async def estimated_count(self) -> int:
+        raise NotImplementedError
+
+    async def recent(self, limit: int) -> List[dict]:
+        """url and cached_at of the most recently cached documents, newest first"""
+        raise NotImplementedError
+
+
+class MongoStorage(CacheStorage):
+    """MongoDB / Atlas collection accessed through a pooled Motor client"""
+
+    name = "mongodb"
+
+    def __init__(self, connection_string: Callable[[], str], database: str, collection: str, **client_options):
+        super().__init__()
+        self.connection_string = connection_string
+        self.database_name = database
+        self.collection_name = collection
+        self.client_options = client_options
+        self.client = None
+        self.db = None
+        self.collection = None
+        self.meta = None
+
+    async def connect(self):
+        # Building the client resolves the SRV record, so do it off the event loop
+        client = await asyncio.to_thread(
+            lambda: AsyncIOMotorClient(self.connection_string(), **self.client_options)
+        )
+        try:
+            await client.admin.command("ping")
+        except Exception:
+            client.close()
+            raise
+        self.client = client
+        self.db = client[self.database_name]
+        self.collection = self.db[self.collection_name]
+        # Small side collection holding the generation counter
+        self.meta = self.db[f"{self.collection_name}_meta"]
+
+    async def close(self):
+        if self.client is not None:
+            self.client.close()
+        self.connected = False
+
+    async def ping(self):
+        await self.client.admin.command("ping")
+
+    async def server_info(self) -> dict:
+        return await self.client.server_info()
+
+    async def stats(self) -> dict:
+        return await self.db.command("dbStats")
+
+    async def ensure_indexes(self):
+        # Lookups use the built-in _id index (_id is the URL hash); cached_at drives
+        # freshness checks and the "recent" listing in /api/cache/stats
+        await self.collection.create_index([("cached_at", -1)], name="cached_at_desc")
+        # Lets the background purge find documents of earlier generations without a collection scan
+        await self.collection.create_index([(GENERATION_FIELD, 1)], name="generation")
+
+    def _current(self, query: dict) -> dict:
+        """Restrict a query to documents of the current generation"""
+        if self.generation > 0:
+            query[GENERATION_FIELD] = {"$gte": self.generation}
+        return query
+
+    async def find_one(self, key, projection=None):
+        return await self.collection.find_one(self._current({"_id": key}), projection)
+
+    async def find_many(self, keys, projection=None):
+        async for doc in self.collection.find(self._current({"_id": {"$in": keys}}), projection):
+            yield doc
+
+    async def replace(self, document):
+        try:
+            await self.collection.replace_one({"_id": document["_id"]}, document, upsert=True)
+        except DuplicateKeyError:
+            # Another worker cached this URL first; our copy is just as fresh
+            self.duplicate_key_races += 1
+
+    async def bulk_replace(self, documents):
+        if not documents:
+            return {}
+        operations = [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in documents]
+        try:
+            await self.collection.bulk_write(operations, ordered=False)
+            return {}
+        except BulkWriteError as e:
+            failed = {}
+            for err in e.details.get("writeErrors", []):
+                if err.get("code") == 11000:  # duplicate key: another worker cached it first
+                    self.duplicate_key_races += 1
+                else:
+                    failed[documents[err["index"]]["_id"]] = err.get("errmsg", "write failed")
+            return failed
+        except Exception as e:
+            return {doc["_id"]: str(e) for doc in documents}
+
+    async def update_fields(self, key, fields):
+        await self.collection.update_one({"_id": key}, {"$set": fields})
+
+    async def delete(self, key):
+        result = await self.collection.delete_one({"_id": key})
+        return result.deleted_count > 0
+
+    async def load_generation(self):
+        meta = await self.meta.find_one({"_id": GENERATION_FIELD})
+        self.generation = meta["value"] if meta else 0
+        return self.generation
+
+    async def bump_generation(self):
+        meta = await self.meta.find_one_and_update(
+            {"_id": GENERATION_FIELD}, {"$inc": {"value": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        self.generation = meta["value"]
+        return self.generation
+
+    async def purge_generations(self, limit):
+        # $not/$gte also matches documents written before generations existed
+        stale = {GENERATION_FIELD: {"$not": {"$gte": self.generation}}}
+        ids = [doc["_id"] async for doc in self.collection.find(stale, {"_id": 1}).limit(limit)]
+        if not ids:
+            return 0
+        # Re-check the generation so an entry re-cached since the find is kept
+        result = await self.collection.delete_many({"_id": {"$in": ids}, **stale})
+        return result.deleted_count
+
+    async def estimated_count(self):
+        # Metadata-based count; avoids scanning the whole collection like count_documents({}).
+        # Includes earlier generations until they are purged.
+        return await self.collection.estimated_document_count()
+
+    async def recent(self, limit):
+        cursor = self.collection.find(self._current({}), {"url": 1, "cached_at": 1}).sort("cached_at", -1).limit(limit)
+        return [{"url": doc.get("url"), "cached_at": doc.get("cached_at")} async for doc in cursor]
+
+
+class SQLiteStorage(CacheStorage):
+    """Single-file SQLite store for single-node deployments and load tests
+
+    The analysis payload and the compressed blob live in their own columns,
+    so score-only projections never read them from disk. The database is
+    memory-mapped (mmap_size) and runs in WAL mode; calls run in a worker
+    thread over one shared connection.
+    """
+
+    name = "sqlite"
+
+    # Top-level fields kept in their own columns instead of the JSON head
+    ANALYSIS_FIELD = "api_response"
+
+    def __init__(self, path: str, mmap_size: int = 256 * 1024 * 1024):
+        super().__init__()
+        self.path = path
+        self.mmap_size = mmap_size
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _call(self, fn, *args):
+        """Run fn(connection, *args) in a worker thread, one statement batch at a time"""
+        def run():
+            with self._lock:
+                return fn(self._conn, *args)
+        return asyncio.to_thread(run)
+
+    async def connect(self):
+        def open_db():
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                " id TEXT PRIMARY KEY, cached_at TEXT, head BLOB NOT NULL, analysis BLOB, blob BLOB,"
+                " generation INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(documents)")}
+            if "generation" not in columns:
+                # Files created before cache generations existed
+                conn.execute("ALTER TABLE documents ADD COLUMN generation INTEGER NOT NULL DEFAULT 0")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            return conn
+        self._conn = await asyncio.to_thread(open_db)
+
+    async def close(self):
+        if self._conn is not None:
+            await self._call(lambda conn: conn.close())
+        self.connected = False
+
+    async def ping(self):
+        await self._call(lambda conn: conn.execute("SELECT 1").fetchone())
+
+    async def server_info(self):
+        return {"version": f"SQLite {sqlite3.sqlite_version}", "path": os.path.abspath(self.path)}
+
+    async def stats(self):
+        def collect(conn):
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            pages, free = conn.execute("SELECT * FROM pragma_page_count(), pragma_freelist_count()").fetchone()
+            objects = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            indexes = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'index'").fetchone()[0]
+            return {
+                "dataSize": (pages - free) * page_size,
+                "storageSize": pages * page_size,
+                "objects": objects,
+                "indexes": indexes,
+            }
+        return await self._call(collect)
+
+    async def ensure_indexes(self):
+        def create(conn):
+            conn.execute("CREATE INDEX IF NOT EXISTS cached_at_desc ON documents (cached_at DESC)")
+            conn.execute("CREATE INDEX IF NOT EXISTS generation ON documents (generation)")
+        await self._call(create)
+
+    def _columns(self, projection):
+        """Columns to read for a projection, skipping the bulky ones it drops"""
+        columns = ["head"]
+        columns.append("analysis" if needs_field(projection, self.ANALYSIS_FIELD) else "NULL")
+        columns.append("blob" if needs_field(projection, BLOB_FIELD) else "NULL")
+        return ", ".join(columns)
+
+    def _decode(self, row, projection):
+        head, analysis, blob = row
+        document = orjson.loads(head)
+        if analysis is not None:
+            document[self.ANALYSIS_FIELD] = orjson.loads(analysis)
+        if blob is not None:
+            document[BLOB_FIELD] = bytes(blob)
+        return project(document, projection)
+
+    def _encode(self, document):
+        head = {k: v for k, v in document.items() if k not in (self.ANALYSIS_FIELD, BLOB_FIELD)}
+        analysis = document.get(self.ANALYSIS_FIELD)
+        blob = document.get(BLOB_FIELD)
+        return (
+            document["_id"],
+            document.get("cached_at"),
+            orjson.dumps(head),
+            orjson.dumps(analysis) if self.ANALYSIS_FIELD in document else None,
+            bytes(blob) if blob is not None else None,
+            document.get(GENERATION_FIELD, 0),
+        )
+
+    async def find_one(self, key, projection=None):
+        sql = f"SELECT {self._columns(projection)} FROM documents WHERE id = ? AND generation >= ?"
+        generation = self.generation
+        row = await self._call(lambda conn: conn.execute(sql, (key, generation)).fetchone())
+        return self._decode(row, projection) if row else None
+
+    async def find_many(self, keys, projection=None):
+        columns = self._columns(projection)
+        generation = self.generation
+
+        def select(conn):
+            rows = []
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows.extend(conn.execute(
+                    f"SELECT {columns} FROM documents WHERE id IN ({placeholders}) AND generation >= ?",
+                    [*chunk, generation],
+                ).fetchall())
+            return rows
+
+        for row in await self._call(select):
+            yield self._decode(row, projection)
+
+    _UPSERT = ("INSERT OR REPLACE INTO documents (id, cached_at, head, analysis, blob, generation)"
+               " VALUES (?, ?, ?, ?, ?, ?)")
+
+    async def replace(self, document):
+        row = self._encode(document)
+        await self._call(lambda conn: conn.execute(self._UPSERT, row))
+
+    async def bulk_replace(self, documents):
+        if not documents:
+            return {}
+        rows = [self._encode(doc) for doc in documents]
+
+        def write(conn):
+            # One transaction for the whole batch
+            with conn:
+                conn.execute("BEGIN")
+                conn.executemany(self._UPSERT, rows)
+
+        try:
+            await self._call(write)
+            return {}
+        except Exception as e:
+            return {doc["_id"]: str(e) for doc in documents}
+
+    async def update_fields(self, key, fields):
+        def update(conn):
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute("SELECT head FROM documents WHERE id = ?", (key,)).fetchone()
+                if row is None:
+                    return
+                head = {**orjson.loads(row[0]), **fields}
+                conn.execute("UPDATE documents SET head = ?, cached_at = ? WHERE id = ?",
+                             (orjson.dumps(head), head.get("cached_at"), key))
+        await self._call(update)
+
+    async def delete(self, key):
+        cursor = await self._call(lambda conn: conn.execute("DELETE FROM documents WHERE id = ?", (key,)))
+        return cursor.rowcount > 0
+
+    async def load_generation(self):
+        row = await self._call(lambda conn: conn.execute(
+            "SELECT value FROM meta WHERE key = 'generation'"
+        ).fetchone())
+        self.generation = row[0] if row else 0
+        return self.generation
+
+    async def bump_generation(self):
+        def bump(conn):
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("INSERT INTO meta (key, value) VALUES ('generation', 1)"
+                             " ON CONFLICT (key) DO UPDATE SET value = value + 1")
+                return conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0]
+        self.generation = await self._call(bump)
+        return self.generation
+
+    async def purge_generations(self, limit):
+        generation = self.generation
+        cursor = await self._call(lambda conn: conn.execute(
+            "DELETE FROM documents WHERE id IN (SELECT id FROM documents WHERE generation < ? LIMIT ?)",
+            (generation, limit),
+        ))
+        return cursor.rowcount
+
+    async def estimated_count(self):
+        # Includes earlier generations until they are purged
+        return await self._call(lambda conn: conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0])
+
+    async def recent(self, limit):
+        generation = self.generation
+        rows = await self._call(lambda conn: conn.execute(
+            "SELECT head FROM documents WHERE generation >= ? ORDER BY cached_at DESC LIMIT ?", (generation, limit)
+        ).fetchall())
+        heads = [orjson.loads(head) for head, in rows]
+        return [{"url": head.get("url"), "cached_at": head.get("cached_at")} for head in heads]
+
+
+class MemoryStorage(CacheStorage):
+    """Process-local dict store for tests and CI; nothing survives a restart"""
+
+    name = "memory"
+
+    def __init__(self):
+        super().__init__()
+        self._documents: Dict[str, dict] = {}
+        self._generation = 0
+
+    def _visible(self, document: Optional[dict]) -> bool:
+        return document is not None and document.get(GENERATION_FIELD, 0) >= self.generation
+
+    async def connect(self):
+        pass
+
+    async def ping(self):
+        pass
+
+    async def server_info(self):
+        return {"version": "in-memory"}
+
+    async def stats(self):
+        size = sum(estimate_size(doc) for doc in self._documents.values())
+        return {"dataSize": size, "storageSize": size, "objects": len(self._documents), "indexes": 0}
+
+    async def find_one(self, key, projection=None):
+        document = self._documents.get(key)
+        return project(document, projection) if self._visible(document) else None
+
+    async def find_many(self, keys, projection=None):
+        for key in keys:
+            document = self._documents.get(key)
+            if self._visible(document):
+                yield project(document, projection)
+
+    async def replace(self, document):
+        self._documents[document["_id"]] = dict(document)
+
+    async def bulk_replace(self, documents):
+        for document in documents:
+            self._documents[document["_id"]] = dict(document)
+        return {}
+
+    async def update_fields(self, key, fields):
+        if key in self._documents:
+            self._documents[key] = {**self._documents[key], **fields}
+
+    async def delete(self, key):
+        return self._documents.pop(key, None) is not None
+
+    async def load_generation(self):
+        self.generation = self._generation
+        return self.generation
+
+    async def bump_generation(self):
+        self._generation += 1
+        self.generation = self._generation
+        return self.generation
+
+    async def purge_generations(self, limit):
+        stale = [key for key, doc in self._documents.items() if not self._visible(doc)][:limit]
+        for key in stale:
+            del self._documents[key]
+        return len(stale)
+
+    async def estimated_count(self):
+        return len(self._documents)
+
+    async def recent(self, limit):
+        current = [doc for doc in self._documents.values() if self._visible(doc)]
+        newest = sorted(current, key=lambda doc: doc.get("cached_at") or "", reverse=True)
+        return [{"url": doc.get("url"), "cached_at": doc.get("cached_at")} for doc in newest[:limit]]
@@ -0,0 +1,85 @@
+# Circuit breaker that fails fast while an upstream service keeps failing
+import time
+from typing import Callable
+
+
+class CircuitBreaker:
+    """Closed -> open after failure_threshold consecutive failures -> half-open after reset_timeout
+
+    While open every call is rejected without touching the upstream. Once
+    reset_timeout has passed, up to half_open_max_calls trial calls are let
+    through: a success closes the circuit, a failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 half_open_max_calls: int = 1, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_calls = 0
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.failure_threshold > 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_calls = 0
+        return self._state
+
+    def retry_after(self) -> float:
+        """Seconds until the open circuit lets a trial call through"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (self.clock() - self._opened_at))
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now; every allowed call must report record_success/record_failure"""
+        if not self.enabled:
+            return True
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and self._trial_calls < self.half_open_max_calls:
+            self._trial_calls += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def record_abandoned(self):
+        """An allowed call ended without an outcome (e.g. cancelled); frees its half-open trial slot"""
+        if self._state == self.HALF_OPEN and self._trial_calls > 0:
+            self._trial_calls -= 1
+
+    def record_success(self):
+        self._failures = 0
+        if self._state != self.CLOSED:
+            print(f"✅ {self.name} recovered, closing circuit")
+        self._state = self.CLOSED
+
+    def record_failure(self):
+        if not self.enabled:
+            return
+        self._failures += 1
+        if self._state == self.HALF_OPEN or (self._state == self.CLOSED and self._failures >= self.failure_threshold):
+            self._open()
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = self.clock()
+        self.times_opened += 1
+        print(f"⚠️  {self.name} circuit opened after {self._failures} consecutive failures; "
+              f"failing fast for {self.reset_timeout:.0f}s")
@@ -0,0 +1,154 @@
+# Bounded in-process work queue for analyses that clients poll for instead of waiting on
+import asyncio
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when max_size jobs are already waiting"""
+
+
+class Job:
+    """One queued unit of work and, once finished, its result or error"""
+
+    def __init__(self, key: Hashable):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = "queued"  # queued -> running -> done | failed
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[Exception] = None
+        self._done = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the job finishes; returns False if timeout elapsed first"""
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def describe(self) -> dict:
+        """Status fields shared by the polling and event-stream endpoints"""
+        now = time.time()
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "wait_seconds": round((self.started_at or now) - self.created_at, 3),
+            "run_seconds": round((self.finished_at or now) - self.started_at, 3) if self.started_at else None,
+        }
+
+
+class JobQueue:
+    """Runs handler(key) for submitted keys on a fixed pool of worker tasks
+
+    At most max_size jobs wait at once (submit raises QueueFull beyond that)
+    and submitting a key that is already queued or running returns the
+    existing job. Finished jobs are kept for result_ttl seconds so clients
+    can collect them.
+    """
+
+    def __init__(self, handler: Callable[[Hashable], Awaitable], workers: int = 4, max_size: int = 1000,
+                 result_ttl: float = 600, on_start: Optional[Callable[[float], None]] = None):
+        self.handler = handler
+        self.workers = workers
+        self.max_size = max_size
+        self.result_ttl = result_ttl
+        self.on_start = on_start  # called with each job's queue wait (seconds)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._jobs: Dict[str, Job] = {}
+        self._active: Dict[Hashable, Job] = {}
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def start(self):
+        """Start the worker tasks (call from a running event loop)"""
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @property
+    def depth(self) -> int:
+        """Jobs waiting for a worker"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def oldest_wait(self) -> float:
+        """Seconds the longest-waiting queued job has been waiting"""
+        now = time.time()
+        return max((now - job.created_at for job in self._active.values() if job.status == "queued"), default=0.0)
+
+    def submit(self, key: Hashable) -> Job:
+        """Queue a job for key, or return the unfinished job already handling it"""
+        job = self._active.get(key)
+        if job is not None:
+            return job
+        if self._queue is None:
+            raise RuntimeError("JobQueue.start() has not been called")
+        self._prune()
+        job = Job(key)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise QueueFull(f"{self.max_size} jobs already queued") from None
+        self._jobs[job.id] = job
+        self._active[key] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is not None and self._expired(job, time.time() - self.result_ttl):
+            return None
+        return job
+
+    @staticmethod
+    def _expired(job: Job, cutoff: float) -> bool:
+        return job.finished and job.finished_at <= cutoff
+
+    def _prune(self):
+        """Forget finished jobs older than result_ttl"""
+        cutoff = time.time() - self.result_ttl
+        for job_id in [job_id for job_id, job in self._jobs.items() if self._expired(job, cutoff)]:
+            del self._jobs[job_id]
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            self.running += 1
+            if self.on_start is not None:
+                self.on_start(job.started_at - job.created_at)
+            try:
+                job.result = await self.handler(job.key)
+                job.status = "done"
+                self.completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job.error = e
+                job.status = "failed"
+                self.failed += 1
+            finally:
+                self.running -= 1
+                job.finished_at = time.time()
+                if self._active.get(job.key) is job:
+                    del self._active[job.key]
+                job._done.set()
+                self._queue.task_done()
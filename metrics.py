@@ -0,0 +1,230 @@
+# Low-overhead in-process metrics with Prometheus text exposition and sampled request traces
+import bisect
+import contextvars
+import random
+import time
+import uuid
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import orjson
+
+CONTENT_TYPE = "text/plain; version=0.0.4"  # the response class appends the charset
+
+# Latency buckets (seconds) wide enough for both L1 hits and multi-minute analyzer calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Registry:
+    """Collection of metrics rendered together on /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames and hasattr(self, "_new_child"):
+            self.labels()  # unlabelled metrics are exported as 0 before their first update
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values):
+        """Child metric for one combination of label values (created on first use)"""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._children[key] = self._new_child()
+        return child
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = "counter"
+    _new_child = _CounterChild
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+                for key, child in self._children.items()]
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observed values (cumulative buckets on render)"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {child.count}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Gauge or counter whose value is read from elsewhere at scrape time
+
+    The callback returns a number, or a dict of label-value tuples to numbers.
+    """
+
+    def __init__(self, name, help, callback: Callable, kind: str = "gauge", labelnames=(), registry=REGISTRY):
+        self.kind = kind
+        self.callback = callback
+        super().__init__(name, help, labelnames, registry)
+
+    def samples(self) -> List[str]:
+        value = self.callback()
+        values = value if isinstance(value, dict) else {(): value}
+        return [f"{self.name}{_format_labels(self.labelnames, tuple(str(v) for v in key))} {_format_value(v)}"
+                for key, v in values.items() if v is not None]
+
+
+# Trace of the request being handled, if it was sampled
+current_trace: contextvars.ContextVar = contextvars.ContextVar("current_trace", default=None)
+
+
+def record_span(name: str, seconds: float, **attributes):
+    """Add a timed stage to the current request's trace (no-op when not sampled)"""
+    trace = current_trace.get()
+    if trace is not None:
+        trace["spans"].append({"stage": name, "ms": round(seconds * 1000, 3), **attributes})
+
+
+def annotate(**attributes):
+    """Attach attributes (cache source, URL, ...) to the current request's trace"""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.update(attributes)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by route and status, sampling some into traces
+
+    Sampled traces are written to stdout as one JSON object per line and the
+    trace id is returned in an X-Trace-Id header.
+    """
+
+    def __init__(self, app, histogram: Histogram, trace_sample_rate: float = 0.0,
+                 emit: Callable[[str], None] = print):
+        self.app = app
+        self.histogram = histogram
+        self.trace_sample_rate = trace_sample_rate
+        self.emit = emit
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = {"code": 500}
+        trace = None
+        token = None
+        if self.trace_sample_rate > 0 and random.random() < self.trace_sample_rate:
+            trace = {"trace_id": uuid.uuid4().hex, "method": scope["method"], "path": scope["path"], "spans": []}
+            token = current_trace.set(trace)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if trace is not None:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-trace-id", trace["trace_id"].encode())
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            self.histogram.labels(scope["method"], path, status["code"]).observe(elapsed)
+            if trace is not None:
+                current_trace.reset(token)
+                trace.update(status=status["code"], route=path, total_ms=round(elapsed * 1000, 3))
+                self.emit(orjson.dumps(trace).decode())
@@ -0,0 +1,39 @@
+# MongoDB Atlas connection settings shared by the API and the offline tools
+#
+# Importing this module only reads the environment (and .env, if
+# python-dotenv is installed): no clients, tasks or log lines, so CLI tools
+# and their worker processes can use it without loading the API.
+import os
+import urllib.parse
+
+# Load environment variables from .env file if available
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+    DOTENV_AVAILABLE = True
+except ImportError:
+    DOTENV_AVAILABLE = False
+
+# MongoDB Atlas connection configuration
+# Load from environment variables or use defaults
+MONGO_USERNAME = os.getenv("MONGO_USERNAME", "m220student")
+MONGO_PASSWORD = os.getenv("MONGO_PASSWORD", "your_password_here")
+MONGO_CLUSTER = os.getenv("MONGO_CLUSTER", "privacy-policy.k3mlivq.mongodb.net")
+DATABASE_NAME = os.getenv("DATABASE_NAME", "url_cache_db")
+COLLECTION_NAME = os.getenv("COLLECTION_NAME", "api_responses")
+
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+
+
+# Construct MongoDB Atlas connection string
+def get_mongo_connection_string():
+    """Construct MongoDB Atlas connection string with credentials"""
+    # URL encode the username and password to handle special characters
+    username = urllib.parse.quote_plus(MONGO_USERNAME)
+    password = urllib.parse.quote_plus(MONGO_PASSWORD)
+
+    # MongoDB Atlas SRV connection string format
+    # Based on your provided URI: mongodb+srv://m220student:<db_password>@privacy-policy.k3mlivq.mongodb.net/?retryWrites=true&w=majority&appName=privacy-policy
+    connection_string = f"mongodb+srv://{username}:{password}@{MONGO_CLUSTER}/?retryWrites=true&w=majority&appName=url-cache-api"
+
+    return connection_string
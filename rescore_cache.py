@@ -0,0 +1,222 @@
+# Offline re-scoring job for cached analyses
+#
+# Streams the cache collection in _id order, re-scores documents in a process
+# pool and writes the new score fields back with unordered bulk updates.
+# Scoring uses batch_scorer.score_batch when numpy is installed and the
+# per-document scorer otherwise (same results). Parsing each payload dominates
+# the scoring time either way, so throughput comes from the worker processes.
+# Progress is checkpointed so an interrupted run can be resumed with --resume.
+#
+#   python rescore_cache.py                   # re-score documents with an outdated scorer_version
+#   python rescore_cache.py --all             # re-score everything
+#   python rescore_cache.py --resume --max-docs-per-sec 500
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from pymongo import MongoClient, UpdateOne
+
+from cache_storage import GENERATION_FIELD
+from privacy_compliance_scorer import SCORER_VERSION, PrivacyComplianceScorer
+from storage_codec import BLOB_FIELD, FORMAT_FIELD, expand
+
+try:
+    from batch_scorer import score_batch
+except ImportError:
+    # numpy is an optional extra for this job only
+    score_batch = None
+
+
+def score_payloads(payloads):
+    """Score fields (privacy_score, score_breakdown, scorer_version) for each analyzer payload"""
+    if score_batch is not None:
+        return score_batch(payloads)
+    now = datetime.utcnow()
+    results = []
+    for data in payloads:
+        scorer = PrivacyComplianceScorer(data or {}, now=now)
+        score = scorer.calculate_score()
+        results.append({"privacy_score": score, "score_breakdown": scorer.component_scores,
+                        "scorer_version": SCORER_VERSION})
+    return results
+from mongo_config import (
+    COLLECTION_NAME,
+    DATABASE_NAME,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    get_mongo_connection_string,
+)
+
+
+def score_chunk(chunk):
+    """Worker: score a list of (_id, stored document) pairs, returning (_id, cached_at, score_fields) triples"""
+    # Compressed payloads are expanded here, in the worker processes
+    results = score_payloads([expand(doc).get("api_response") for _, doc in chunk])
+    return [(doc_id, doc.get("cached_at"), fields) for (doc_id, doc), fields in zip(chunk, results)]
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, state):
+    # Write then rename so a crash never leaves a truncated checkpoint behind
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+class RateLimiter:
+    """Blocks so that no more than max_per_sec documents are processed on average"""
+
+    def __init__(self, max_per_sec):
+        self.max_per_sec = max_per_sec
+        self.started = time.monotonic()
+        self.count = 0
+
+    def wait(self, n):
+        self.count += n
+        if self.max_per_sec <= 0:
+            return
+        earliest = self.started + self.count / self.max_per_sec
+        delay = earliest - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def read_chunks(collection, query, batch_size, chunk_size):
+    """Yield lists of (_id, stored document) pairs from a batched cursor in _id order"""
+    cursor = (
+        collection.find(query, {"cached_at": 1, "api_response": 1, BLOB_FIELD: 1, FORMAT_FIELD: 1})
+        .sort("_id", 1)
+        .batch_size(batch_size)
+    )
+    chunk = []
+    for doc in cursor:
+        chunk.append((doc["_id"], doc))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def score_in_order(pool, chunks, max_pending):
+    """Score chunks in the pool with bounded read-ahead, yielding results in cursor order
+
+    Results are yielded in order so the checkpoint only ever moves past written
+    documents; the bound keeps the cursor from being drained into memory.
+    """
+    pending = deque()
+    for chunk in chunks:
+        pending.append(pool.submit(score_chunk, chunk))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def write_scores(collection, scored, outdated_filter):
+    """Write score fields back with one unordered bulk update; returns how many documents were updated
+
+    Each update only applies to the analysis that was scored: if the service
+    re-analyzed a document (new cached_at) or re-scored it since it was read,
+    the filter no longer matches and the newer score is kept.
+    """
+    operations = [
+        UpdateOne({"_id": doc_id, "cached_at": cached_at, **outdated_filter}, {"$set": fields})
+        for doc_id, cached_at, fields in scored
+    ]
+    if not operations:
+        return 0
+    return collection.bulk_write(operations, ordered=False).matched_count
+
+
+def run(args):
+    client = MongoClient(get_mongo_connection_string(),
+                         serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS)
+    collection = client[DATABASE_NAME][COLLECTION_NAME]
+
+    outdated_filter = {} if args.all else {"$or": [
+        {"scorer_version": {"$lt": SCORER_VERSION}},
+        {"scorer_version": {"$exists": False}},
+    ]}
+    query = dict(outdated_filter)
+    # Skip entries invalidated by /api/cache/clear; the service's purge job deletes them
+    meta = client[DATABASE_NAME][f"{COLLECTION_NAME}_meta"].find_one({"_id": GENERATION_FIELD})
+    if meta and meta["value"] > 0:
+        current = {GENERATION_FIELD: {"$gte": meta["value"]}}
+        query = {"$and": [query, current]} if query else current
+
+    state = load_checkpoint(args.checkpoint) if args.resume else None
+    if state and state.get("scorer_version") != SCORER_VERSION:
+        # Documents up to last_id were scored with another scorer; skipping them would leave them stale
+        sys.exit(f"❌ Checkpoint {args.checkpoint} was written for scorer version {state.get('scorer_version')}, "
+                 f"not {SCORER_VERSION}. Run again without --resume to start over.")
+    if state:
+        print(f"↩️  Resuming after _id {state['last_id']!r} ({state['processed']} documents already done)")
+        query = {"$and": [query, {"_id": {"$gt": state["last_id"]}}]} if query else {"_id": {"$gt": state["last_id"]}}
+    else:
+        state = {"last_id": None, "processed": 0, "scorer_version": SCORER_VERSION,
+                 "started_at": datetime.utcnow().isoformat()}
+
+    remaining = collection.count_documents(query)
+    print(f"🧮 Re-scoring {remaining} documents with scorer version {SCORER_VERSION} "
+          f"({args.workers} workers, chunks of {args.chunk_size}, "
+          f"{'NumPy batch' if score_batch is not None else 'per-document'} scorer)")
+
+    limiter = RateLimiter(args.max_docs_per_sec)
+    started = time.monotonic()
+    last_report = started
+    done = 0
+    skipped = 0
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for scored in score_in_order(pool, read_chunks(collection, query, args.batch_size, args.chunk_size),
+                                     max_pending=args.workers * 2):
+            skipped += len(scored) - write_scores(collection, scored, outdated_filter)
+            done += len(scored)
+            state["processed"] += len(scored)
+            state["last_id"] = scored[-1][0]
+            save_checkpoint(args.checkpoint, state)
+            limiter.wait(len(scored))
+
+            now = time.monotonic()
+            if now - last_report >= args.report_every or done >= remaining:
+                rate = done / max(now - started, 1e-9)
+                eta = (remaining - done) / rate if rate and remaining > done else 0
+                print(f"📈 {done}/{remaining} documents, {rate:.0f} docs/s, ETA {eta:.0f}s")
+                last_report = now
+
+    elapsed = time.monotonic() - started
+    print(f"✅ Re-scored {done} documents in {elapsed:.1f}s ({done / max(elapsed, 1e-9):.0f} docs/s)")
+    if skipped:
+        print(f"⏭️  {skipped} of them were re-analyzed or re-scored by the service meanwhile and kept their newer score")
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute stored privacy scores for cached analyses")
+    parser.add_argument("--all", action="store_true",
+                        help="re-score every document, not only those with an older scorer_version")
+    parser.add_argument("--resume", action="store_true", help="continue from the checkpoint file")
+    parser.add_argument("--checkpoint", default="rescore_checkpoint.json", help="checkpoint file path")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="scoring processes")
+    parser.add_argument("--batch-size", type=int, default=1000, help="cursor batch size")
+    parser.add_argument("--chunk-size", type=int, default=500, help="documents per scoring task / bulk write")
+    parser.add_argument("--max-docs-per-sec", type=float, default=0,
+                        help="throughput cap to protect live traffic (0 = unlimited)")
+    parser.add_argument("--report-every", type=float, default=5, help="seconds between progress lines")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
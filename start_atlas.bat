@@ -31,27 +31,6 @@ pip install -r requirements.txt
 REM Check for environment file
 if exist ".env" (
     echo ✅ Environment file (.env) found
-    
-    REM Test MongoDB connection
-    echo.
-    echo 🔍 Testing MongoDB Atlas connection...
-    python test_connection.py
-    
-    if %errorlevel% neq 0 (
-        echo.
-        echo ⚠️  MongoDB Atlas connection test failed
-        echo Please check:
-        echo 1. Your password is set correctly in .env file
-        echo 2. Your IP address is whitelisted in MongoDB Atlas
-        echo 3. Your internet connection is working
-        echo.
-        set /p continue="Do you want to continue anyway? (y/N): "
-        if /I "%continue%" neq "y" (
-            echo Exiting...
-            pause
-            exit /b 1
-        )
-    )
 ) else (
     echo ⚠️  Environment file (.env) not found
     echo.
@@ -78,12 +57,18 @@ echo 🌐 API will be available at:
 echo    • Main API: http://localhost:8001
 echo    • API Docs: http://localhost:8001/docs  
 echo    • Health Check: http://localhost:8001/health
+echo    • Readiness: http://localhost:8001/health/ready (503 until MongoDB Atlas is connected)
 echo    • Database Info: http://localhost:8001/api/db/info
 echo    • Example: http://localhost:8001/api/fetch?url=https://jsonplaceholder.typicode.com/posts/1
 echo.
-echo 📝 To test the API, open new Command Prompt and run:
+echo 📝 If /health/ready stays 503, check the connection errors logged below:
+echo    1. Your password is set correctly in .env file
+echo    2. Your IP address is whitelisted in MongoDB Atlas
+echo    3. Your internet connection is working
+echo.
+echo 📈 To benchmark, open new Command Prompt and run:
 echo    venv\Scripts\activate
-echo    python test_api_full.py
+echo    python benchmark.py
 echo.
 echo 🛑 To stop the server, press Ctrl+C
 echo.
@@ -0,0 +1,103 @@
+# Compressed storage format for the bulky part of cached analyzer payloads
+import zlib
+from typing import Optional
+
+import orjson
+from bson.binary import Binary
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Bumped whenever the layout of the compressed blob changes
+STORAGE_FORMAT_VERSION = 1
+
+BLOB_FIELD = "api_response_blob"
+FORMAT_FIELD = "storage_format"
+
+
+def _compress(codec: str, data: bytes, level: int) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return zlib.compress(data, level)
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Document was stored with zstd but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    raise RuntimeError(f"Unknown storage codec: {codec!r}")
+
+
+class StorageCodec:
+    """Stores the per-request and per-cookie lists of api_response as one compressed blob
+
+    Lookup and metadata fields (url, cached_at, scores and the rest of
+    api_response) stay plain BSON so they remain queryable and projectable;
+    only expand() pays for decompression. Documents without a blob are
+    returned unchanged, so uncompressed entries stay readable.
+    """
+
+    def __init__(self, codec: str = "none", level: Optional[int] = None):
+        codec = codec.lower()
+        if codec not in ("none", "zlib", "zstd"):
+            raise ValueError(f"Unknown storage codec: {codec!r} (expected none, zlib or zstd)")
+        if codec == "zstd" and zstandard is None:
+            print("⚠️  zstandard not installed. Falling back to zlib storage compression.")
+            codec = "zlib"
+        self.codec = codec
+        self.level = level if level is not None else (3 if codec == "zstd" else 6)
+
+    @property
+    def enabled(self) -> bool:
+        return self.codec != "none"
+
+    def encode(self, document: dict) -> dict:
+        """Copy of a cache document with the bulky payload fields compressed into a blob"""
+        analysis = document.get("api_response")
+        if not self.enabled or not isinstance(analysis, dict):
+            return document
+        # Shallow copies only, so the caller's document is left untouched
+        analysis = dict(analysis)
+        bulky = {}
+        if "network_requests" in analysis:
+            bulky["network_requests"] = analysis.pop("network_requests")
+        for phase in ("before_consent", "after_consent"):
+            section = analysis.get(phase)
+            if isinstance(section, dict) and "cookies" in section:
+                section = dict(section)
+                bulky[phase] = {"cookies": section.pop("cookies")}
+                analysis[phase] = section
+        if not bulky:
+            return document
+        blob = _compress(self.codec, orjson.dumps(bulky), self.level)
+        return {
+            **document,
+            "api_response": analysis,
+            BLOB_FIELD: Binary(blob),
+            FORMAT_FIELD: {"version": STORAGE_FORMAT_VERSION, "codec": self.codec},
+        }
+
+
+def expand(document: dict) -> dict:
+    """Copy of a stored document with the compressed blob merged back into api_response"""
+    if BLOB_FIELD not in document:
+        return document
+    storage_format = document.get(FORMAT_FIELD) or {}
+    version = storage_format.get("version")
+    if version != STORAGE_FORMAT_VERSION:
+        raise RuntimeError(f"Unsupported storage format version: {version!r}")
+    bulky = orjson.loads(_decompress(storage_format.get("codec"), document[BLOB_FIELD]))
+    analysis = dict(document.get("api_response") or {})
+    for key, value in bulky.items():
+        if isinstance(value, dict) and isinstance(analysis.get(key), dict):
+            analysis[key] = {**analysis[key], **value}
+        else:
+            analysis[key] = value
+    expanded = {k: v for k, v in document.items() if k not in (BLOB_FIELD, FORMAT_FIELD)}
+    expanded["api_response"] = analysis
+    return expanded
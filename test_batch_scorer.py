@@ -0,0 +1,191 @@
+# Randomized parity check: batch_scorer.score_batch vs PrivacyComplianceScorer
+#
+# Scores seeded random payloads both ways and requires identical results, with
+# cookie expiries clustered on the 183-day boundary and reported in both
+# seconds and milliseconds. Expiry scores are also checked against a plain
+# datetime implementation of the original lifespan rule.
+#
+#   python -m pytest -q test_batch_scorer.py
+#   python test_batch_scorer.py [payloads] [seed]
+import copy
+import datetime
+import math
+import random
+import sys
+import warnings
+
+import pytest
+
+pytest.importorskip("numpy")  # batch_scorer's optional dependency
+
+from analysis_model import expiry_cutoff
+from batch_scorer import score_batch
+from privacy_compliance_scorer import EXPIRY_THRESHOLD_DAYS, SCORER_VERSION, PrivacyComplianceScorer
+
+TRACKER_CATEGORIES = [None, None, "advertising", "social", "fingerprinting invasive", "analytics", "Advertising"]
+
+
+def boundary_expiries(now: datetime.datetime, threshold_days: float = EXPIRY_THRESHOLD_DAYS) -> list:
+    """Expiries (epoch seconds) on and immediately around the long-lived cutoff"""
+    now_s = (now - datetime.datetime(1970, 1, 1)).total_seconds()
+    cutoff = expiry_cutoff(now, threshold_days)
+    nominal = now_s + threshold_days * 86400
+    return [
+        cutoff, math.nextafter(cutoff, -math.inf), math.nextafter(cutoff, math.inf),
+        nominal, nominal - 1e-6, nominal + 1e-6, nominal - 0.5e-6, nominal + 0.5e-6,
+        float(math.floor(nominal)), float(math.ceil(nominal)), nominal - 1, nominal + 1,
+        now_s, now_s - 1e-6, now_s + 1e-6,
+    ]
+
+
+def random_expiry(rng: random.Random, now: datetime.datetime, boundary: list):
+    now_s = (now - datetime.datetime(1970, 1, 1)).total_seconds()
+    kind = rng.random()
+    if kind < 0.15:
+        return rng.choice([0, None, 0.0])  # session cookie
+    if kind < 0.55:
+        exp = rng.choice(boundary)
+    elif kind < 0.7:
+        exp = now_s - rng.uniform(0, 30 * 86400)  # already expired
+    else:
+        exp = now_s + rng.uniform(0, 400 * 86400)
+    if rng.random() < 0.5:
+        exp = round(exp)  # analyzers usually report whole seconds
+    if rng.random() < 0.4:
+        exp = exp * 1000  # ...or milliseconds
+        if rng.random() < 0.5:
+            exp = round(exp)
+    return exp
+
+
+def random_payload(rng: random.Random, now: datetime.datetime, boundary: list) -> dict:
+    def cookies(n):
+        out = []
+        for i in range(n):
+            cookie = {"name": f"c{i}", "domain": f"site{rng.randint(0, 3)}.example"}
+            exp = random_expiry(rng, now, boundary)
+            if exp is not None:
+                cookie["expires"] = exp
+            out.append(cookie)
+        return out
+
+    def summary():
+        return {
+            "necessary": rng.randint(0, 5),
+            "uncategorized": rng.randint(0, 5),
+            "marketing": rng.randint(0, 3),
+        }
+
+    def request(i):
+        req = {"url": f"https://cdn{rng.randint(0, 9)}.example/r/{i}"}
+        category = rng.choice(TRACKER_CATEGORIES)
+        if category:
+            req["_tracker"] = {"category": category}
+        return req
+
+    before_summary = summary()
+    after_summary = dict(before_summary) if rng.random() < 0.3 else summary()
+    before = cookies(rng.randint(0, 8))
+    return {
+        "metadata": {"url": "https://example.com"},
+        "banner_analysis": {
+            "consent_banner_existance": {"exists": rng.random() < 0.7},
+            "consent_banner_quality": {
+                "language_clarity": rng.random() < 0.5,
+                "manipulative_wording": rng.random() < 0.3,
+            },
+            "granular_controls": {
+                "accept_all_button_presence": rng.random() < 0.7,
+                "reject_all_button_presence": rng.random() < 0.5,
+                "manage_preferences_button_presence": rng.random() < 0.5,
+            },
+        },
+        "before_consent": {"cookie_category_summary": before_summary, "cookies": before},
+        "after_consent": {
+            "cookie_category_summary": after_summary,
+            "cookies": (before if rng.random() < 0.3 else []) + cookies(rng.randint(0, 8)),
+        },
+        "network_requests": [request(i) for i in range(rng.randint(0, 12))],
+        "breach_data": [{"name": f"breach{i}"} for i in range(rng.randint(0, 12))],
+    }
+
+
+def reference_expiry_score(data: dict, now: datetime.datetime, threshold_days: float = EXPIRY_THRESHOLD_DAYS) -> float:
+    """Fraction of cookies living at most threshold_days, with datetimes as the scorer originally did it"""
+    cookies = data["before_consent"]["cookies"] + data["after_consent"]["cookies"]
+    if not cookies:
+        return 1.0
+    short_lived = 0
+    for cookie in cookies:
+        exp = cookie.get("expires")
+        if not exp:
+            continue
+        if exp > 1e12:
+            exp /= 1000
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            expires_at = datetime.datetime.utcfromtimestamp(exp)
+        lifespan = max((expires_at - now).total_seconds() / 86400, 0)
+        if lifespan <= threshold_days:
+            short_lived += 1
+    return round(short_lived / len(cookies), 2)
+
+
+def check_parity(count: int = 2000, seed: int = 11) -> int:
+    """Score `count` random payloads with both scorers; returns how many had a boundary expiry"""
+    rng = random.Random(seed)
+    on_boundary = 0
+    for _ in range(count // 100):
+        now = datetime.datetime(2026, 1, 1) + datetime.timedelta(
+            seconds=rng.randint(0, 365 * 86400), microseconds=rng.choice([0, rng.randint(0, 999_999)]))
+        boundary = boundary_expiries(now)
+        payloads = [random_payload(rng, now, boundary) for _ in range(100)]
+        batch = score_batch(payloads, now=now)
+        for data, result in zip(payloads, batch):
+            scorer = PrivacyComplianceScorer(copy.deepcopy(data), now=now)
+            expected = scorer.calculate_score()
+            context = f"seed={seed} now={now.isoformat()} payload={data}"
+            assert result["privacy_score"] == expected, context
+            assert result["score_breakdown"] == scorer.component_scores, context
+            assert result["scorer_version"] == SCORER_VERSION, context
+            assert result["score_breakdown"]["expiry"] == reference_expiry_score(data, now), context
+            cookies = data["before_consent"]["cookies"] + data["after_consent"]["cookies"]
+            expiries = {c.get("expires") for c in cookies}
+            on_boundary += any(e in expiries or e * 1000 in expiries for e in boundary[:3])
+    return on_boundary
+
+
+def test_batch_matches_scalar_scorer():
+    assert check_parity() > 0
+
+
+def test_boundary_and_millisecond_expiries():
+    now = datetime.datetime(2026, 3, 14, 15, 9, 26, 535897)
+    cutoff = expiry_cutoff(now, EXPIRY_THRESHOLD_DAYS)
+    just_over = math.nextafter(cutoff, math.inf)
+    cases = [
+        ([cutoff], 1.0),
+        ([just_over], 0.0),
+        ([cutoff * 1000], reference_expiry_score({"before_consent": {"cookies": [{"expires": cutoff * 1000}]},
+                                                  "after_consent": {"cookies": []}}, now)),
+        ([cutoff, just_over, 0, (math.ceil(cutoff) + 1) * 1000], 0.25),
+    ]
+    for expiries, expected in cases:
+        data = {
+            "before_consent": {"cookies": [{"name": f"c{i}", "expires": e} for i, e in enumerate(expiries)]},
+            "after_consent": {"cookies": []},
+        }
+        scorer = PrivacyComplianceScorer(copy.deepcopy(data), now=now)
+        scorer.calculate_score()
+        [result] = score_batch([data], now=now)
+        assert scorer.component_scores["expiry"] == expected, expiries
+        assert result["score_breakdown"]["expiry"] == expected, expiries
+        assert reference_expiry_score(data, now) == expected, expiries
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 11
+    on_boundary = check_parity(count, seed)
+    test_boundary_and_millisecond_expiries()
+    print(f"✅ {count} payloads scored identically ({on_boundary} with an expiry on the {EXPIRY_THRESHOLD_DAYS}-day cutoff)")
@@ -0,0 +1,77 @@
+# POST /api/fetch/batch against the in-memory backend with a stubbed analyzer
+#
+#   python -m pytest -q test_fetch_batch.py
+import asyncio
+import os
+
+os.environ["STORAGE_BACKEND"] = "memory"
+
+import httpx
+
+import url_cache_app_atlas as app_module
+
+ANALYSIS = {
+    "banner_analysis": {"consent_banner_existance": {"exists": True}},
+    "before_consent": {"cookie_category_summary": {"necessary": 1}, "cookies": []},
+    "after_consent": {"cookie_category_summary": {"necessary": 1}, "cookies": []},
+    "network_requests": [],
+}
+
+
+def post_batch(payload: dict, analyzed: list) -> httpx.Response:
+    async def fake_analyzer(url):
+        analyzed.append(url)
+        return {"success": True, "data": ANALYSIS, "status_code": 200, "size": 256}
+
+    async def run():
+        app_module.storage = app_module.MemoryStorage()
+        app_module.storage.connected = True
+        app_module.l1_cache.clear()
+        app_module.make_api_call = fake_analyzer
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/api/fetch/batch", json=payload)
+            await app_module.batch_writes.close()
+            return response
+
+    return asyncio.run(run())
+
+
+def test_invalid_urls_fail_only_their_own_entry():
+    analyzed = []
+    urls = ["ftp://x", "HTTPS://Example.com/?utm_source=x", "http://", "https://example.com/", "ftp://x"]
+    response = post_batch({"urls": urls, "view": "score"}, analyzed)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["total"], body["succeeded"], body["failed"]) == (3, 1, 2)
+    invalid, example, garbage = body["results"]
+
+    assert invalid["status"] == "error" and invalid["status_code"] == 422
+    assert invalid["url"] == "ftp://x" and invalid["requested_urls"] == ["ftp://x"]
+    assert garbage["status_code"] == 422 and garbage["requested_urls"] == ["http://"]
+
+    # Both spellings of example.com share one analysis and are echoed back
+    assert example["status"] == "ok" and example["source"] == "fresh_api_call"
+    assert example["requested_urls"] == ["HTTPS://Example.com/?utm_source=x", "https://example.com/"]
+    assert analyzed == [example["url"]]
+
+
+def test_streamed_batch_reports_invalid_urls_per_line():
+    analyzed = []
+    response = post_batch({"urls": ["https://example.com", "ftp://x"], "stream": True, "view": "score"}, analyzed)
+
+    assert response.status_code == 200
+    lines = [httpx.Response(200, content=line).json() for line in response.content.splitlines()]
+    by_status = {line["status"]: line for line in lines}
+    assert by_status["error"]["requested_urls"] == ["ftp://x"]
+    assert by_status["ok"]["requested_urls"] == ["https://example.com"]
+
+
+def test_batch_of_only_invalid_urls_is_not_rejected():
+    analyzed = []
+    response = post_batch({"urls": ["ftp://x"]}, analyzed)
+
+    assert response.status_code == 200
+    assert response.json()["failed"] == 1
+    assert analyzed == []
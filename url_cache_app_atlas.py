@@ -1,21 +1,68 @@
 # URL Cache API - FastAPI Web Application (MongoDB Atlas Version)
 import os
-from fastapi import FastAPI, HTTPException, Query
-from pymongo import MongoClient
-import requests
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+import gzip
 import hashlib
-from datetime import datetime
-from typing import Optional
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import AsyncIterator, List, Literal, Optional
 import json
-import urllib.parse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+import orjson
+
+from analyzer_client import AnalyzerClient
+from circuit_breaker import CircuitBreaker
+from job_queue import Job, JobQueue, QueueFull
+from cache_storage import GENERATION_FIELD, CacheStorage, MemoryStorage, MongoStorage, SQLiteStorage
+from memory_cache import TTLCache
+from mongo_config import (
+    COLLECTION_NAME,
+    DATABASE_NAME,
+    DOTENV_AVAILABLE,
+    MONGO_CLUSTER,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    MONGO_USERNAME,
+    get_mongo_connection_string,
+)
+from metrics import CONTENT_TYPE, REGISTRY, CallbackMetric, Counter, Histogram, MetricsMiddleware, annotate, record_span
+from privacy_compliance_scorer import PrivacyComplianceScorer, SCORER_VERSION
+from single_flight import SingleFlight
+from storage_codec import BLOB_FIELD, FORMAT_FIELD, StorageCodec, expand
+from url_keys import DEFAULT_TRACKING_PARAMS, URLCanonicalizer
+from write_batcher import WriteBatcher
 
-from privacy_compliance_scorer import PrivacyComplianceScorer
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup/shutdown hook"""
+    # Connect in the background so the worker starts serving (liveness) immediately
+    connect_task = asyncio.create_task(connect_with_retry())
+    stats_task = asyncio.create_task(refresh_stats_periodically())
+    health_task = asyncio.create_task(probe_health_periodically())
+    purge_task = asyncio.create_task(purge_generations_periodically())
+    analysis_jobs.start()
+    yield
+    connect_task.cancel()
+    stats_task.cancel()
+    health_task.cancel()
+    purge_task.cancel()
+    await analysis_jobs.stop()
+    await batch_writes.close()
+    await analyzer_client.close()
+    await storage.close()
 
 # Initialize FastAPI app
-app = FastAPI(title="URL Cache API", description="Cache API responses in MongoDB Atlas")
+app = FastAPI(
+    title="URL Cache API",
+    description="Cache API responses in MongoDB Atlas",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 origins = [
     "http://localhost",
@@ -37,107 +84,355 @@ app.add_middleware(
 class AnalyzeRequest(BaseModel):
     url: str
 
-# MongoDB Atlas connection configuration
-# Load from environment variables or use defaults
-MONGO_USERNAME = os.getenv("MONGO_USERNAME", "m220student")
-MONGO_PASSWORD = os.getenv("MONGO_PASSWORD", "your_password_here")  
-MONGO_CLUSTER = os.getenv("MONGO_CLUSTER", "privacy-policy.k3mlivq.mongodb.net")
-DATABASE_NAME = os.getenv("DATABASE_NAME", "url_cache_db")
-COLLECTION_NAME = os.getenv("COLLECTION_NAME", "api_responses")
-
-# Load environment variables from .env file if available
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-    # Reload variables after loading .env
-    MONGO_USERNAME = os.getenv("MONGO_USERNAME", MONGO_USERNAME)
-    MONGO_PASSWORD = os.getenv("MONGO_PASSWORD", MONGO_PASSWORD)
-    MONGO_CLUSTER = os.getenv("MONGO_CLUSTER", MONGO_CLUSTER)
-    DATABASE_NAME = os.getenv("DATABASE_NAME", DATABASE_NAME)
-    COLLECTION_NAME = os.getenv("COLLECTION_NAME", COLLECTION_NAME)
+# How much of the stored analysis a response includes:
+# score = score fields only, summary = analysis without the per-request/per-cookie lists, full = everything
+ResponseView = Literal["score", "summary", "full"]
+
+# sync waits for the analyzer on a cache miss, async answers 202 with a job to poll
+FetchMode = Literal["sync", "async"]
+
+class BatchAnalyzeRequest(BaseModel):
+    urls: List[str]
+    stream: bool = False
+    view: ResponseView = "full"
+
+class WarmCacheRequest(BaseModel):
+    urls: List[str] = []
+    recent: int = 0                     # also warm the N most recently cached URLs
+    concurrency: Optional[int] = None   # defaults to WARM_CONCURRENCY
+    rate: Optional[float] = None        # analyzer calls started per second, defaults to WARM_RATE
+    force: bool = False                 # re-analyze fresh entries too
+
+if DOTENV_AVAILABLE:
     print("✅ Loaded environment variables from .env file")
-except ImportError:
+else:
     print("⚠️  python-dotenv not installed. Using system environment variables or defaults.")
 
-# Construct MongoDB Atlas connection string
-def get_mongo_connection_string():
-    """Construct MongoDB Atlas connection string with credentials"""
-    # URL encode the username and password to handle special characters
-    username = urllib.parse.quote_plus(MONGO_USERNAME)
-    password = urllib.parse.quote_plus(MONGO_PASSWORD)
-    
-    # MongoDB Atlas SRV connection string format
-    # Based on your provided URI: mongodb+srv://m220student:<db_password>@privacy-policy.k3mlivq.mongodb.net/?retryWrites=true&w=majority&appName=privacy-policy
-    connection_string = f"mongodb+srv://{username}:{password}@{MONGO_CLUSTER}/?retryWrites=true&w=majority&appName=url-cache-api"
-    
-    return connection_string
+# Upstream analyzer configuration
+ANALYZER_ENDPOINT = os.getenv("ANALYZER_ENDPOINT", "http://127.0.0.1:8000/analyze_cookies")
+ANALYZER_MAX_CONCURRENCY = int(os.getenv("ANALYZER_MAX_CONCURRENCY", "8"))
+ANALYZER_CONNECT_TIMEOUT = float(os.getenv("ANALYZER_CONNECT_TIMEOUT", "5"))
+ANALYZER_READ_TIMEOUT = float(os.getenv("ANALYZER_READ_TIMEOUT", "300"))
 
-# Initialize MongoDB client with Atlas connection
-try:
-    connection_string = get_mongo_connection_string()
-    print(f"🔗 Connecting to: mongodb+srv://{MONGO_USERNAME}:***@{MONGO_CLUSTER}/...")
-    
-    client = MongoClient(connection_string)
-    
-    # Test the connection
-    client.admin.command('ping')
-    print("✅ Successfully connected to MongoDB Atlas!")
-    
-    db = client[DATABASE_NAME]
-    collection = db[COLLECTION_NAME]
-    
-    # Print connection details
-    server_info = client.server_info()
-    print(f"📊 MongoDB Version: {server_info.get('version')}")
-    print(f"📂 Database: {DATABASE_NAME}")
-    print(f"📄 Collection: {COLLECTION_NAME}")
-    
-except Exception as e:
-    print(f"❌ Failed to connect to MongoDB Atlas: {e}")
-    print("Please check your credentials and connection string")
-    print(f"Username: {MONGO_USERNAME}")
-    print(f"Cluster: {MONGO_CLUSTER}")
-    print("Make sure to replace 'your_password_here' in .env file with your actual password")
-    client = None
-    db = None
-    collection = None
+# Circuit breaker: after ANALYZER_BREAKER_FAILURES consecutive network errors/5xx, misses fail fast
+# with 503 for ANALYZER_BREAKER_RESET seconds before a trial call is let through (0 failures disables)
+ANALYZER_BREAKER_FAILURES = int(os.getenv("ANALYZER_BREAKER_FAILURES", "5"))
+ANALYZER_BREAKER_RESET = float(os.getenv("ANALYZER_BREAKER_RESET", "30"))
+
+analyzer_breaker = CircuitBreaker(
+    "Analyzer",
+    failure_threshold=ANALYZER_BREAKER_FAILURES,
+    reset_timeout=ANALYZER_BREAKER_RESET,
+)
+
+analyzer_client = AnalyzerClient(
+    ANALYZER_ENDPOINT,
+    max_concurrency=ANALYZER_MAX_CONCURRENCY,
+    connect_timeout=ANALYZER_CONNECT_TIMEOUT,
+    read_timeout=ANALYZER_READ_TIMEOUT,
+    breaker=analyzer_breaker,
+)
+
+# Negative cache: analyzer 4xx answers (invalid or unreachable site) are remembered per URL for
+# NEGATIVE_CACHE_TTL seconds and replayed without calling the analyzer again (0 disables)
+NEGATIVE_CACHE_TTL = float(os.getenv("NEGATIVE_CACHE_TTL", "60"))
+NEGATIVE_CACHE_MAX_BYTES = int(os.getenv("NEGATIVE_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+
+negative_cache = TTLCache(ttl_seconds=NEGATIVE_CACHE_TTL, max_bytes=NEGATIVE_CACHE_MAX_BYTES,
+                          sizeof=lambda failure: len(failure["detail"]) + 64)
+
+# Upstream statuses that depend on the client or the load rather than the URL, so never cached
+NEGATIVE_CACHE_EXCLUDED_STATUSES = (408, 409, 425, 429)
+
+# Concurrent misses for the same URL share one analyzer call and insert
+miss_flights = SingleFlight()
+
+# Per-worker L1 cache in front of the Atlas collection (set TTL or size to 0 to disable)
+L1_CACHE_TTL = float(os.getenv("L1_CACHE_TTL", "300"))
+L1_CACHE_MAX_BYTES = int(os.getenv("L1_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+l1_cache = TTLCache(ttl_seconds=L1_CACHE_TTL, max_bytes=L1_CACHE_MAX_BYTES)
+
+# Allowance for a freshly analyzed document's url, timestamps and scores on top of the analyzer body
+DOCUMENT_HEAD_BYTES = 512
+
+# Freshness policy: entries younger than CACHE_MAX_AGE are served as-is, entries
+# within the following CACHE_STALE_WINDOW are served while a background refresh
+# runs, anything older is re-analyzed before responding. CACHE_MAX_AGE=0 disables expiry.
+CACHE_MAX_AGE = float(os.getenv("CACHE_MAX_AGE", str(7 * 24 * 3600)))
+CACHE_STALE_WINDOW = float(os.getenv("CACHE_STALE_WINDOW", str(7 * 24 * 3600)))
+
+# Response compression: gzip bodies of at least GZIP_MIN_SIZE bytes for clients that accept it
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+
+# Optional compression of the bulky api_response lists at rest: none, zlib or zstd
+# (documents written with any setting stay readable when it changes)
+STORAGE_CODEC = os.getenv("STORAGE_CODEC", "none")
+STORAGE_COMPRESSION_LEVEL = os.getenv("STORAGE_COMPRESSION_LEVEL")
+
+storage_codec = StorageCodec(
+    STORAGE_CODEC,
+    level=int(STORAGE_COMPRESSION_LEVEL) if STORAGE_COMPRESSION_LEVEL else None,
+)
+
+# URL canonicalization: equivalent URLs share one cache entry keyed by the hash of the canonical URL
+def env_flag(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+URL_STRIP_TRACKING_PARAMS = env_flag("URL_STRIP_TRACKING_PARAMS", True)
+URL_TRACKING_PARAMS = os.getenv("URL_TRACKING_PARAMS", ",".join(DEFAULT_TRACKING_PARAMS)).split(",")
+URL_SORT_QUERY = env_flag("URL_SORT_QUERY", True)
+URL_STRIP_TRAILING_SLASH = env_flag("URL_STRIP_TRAILING_SLASH", True)
+URL_KEY_ORIGIN_ONLY = env_flag("URL_KEY_ORIGIN_ONLY", False)
+
+url_canonicalizer = URLCanonicalizer(
+    strip_tracking=URL_STRIP_TRACKING_PARAMS,
+    tracking_params=URL_TRACKING_PARAMS,
+    sort_query=URL_SORT_QUERY,
+    strip_trailing_slash=URL_STRIP_TRAILING_SLASH,
+    origin_only=URL_KEY_ORIGIN_ONLY,
+)
+
+# Browser/proxy caching of /api/fetch responses; 0 makes clients revalidate with If-None-Match every time
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "0"))
+
+# Batch endpoint limits
+BATCH_MAX_URLS = int(os.getenv("BATCH_MAX_URLS", "100"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+# Batch misses that finish within BATCH_WRITE_WINDOW seconds of each other are stored with one
+# bulk write of at most BATCH_WRITE_MAX_DOCS documents
+BATCH_WRITE_MAX_DOCS = int(os.getenv("BATCH_WRITE_MAX_DOCS", "50"))
+BATCH_WRITE_WINDOW = float(os.getenv("BATCH_WRITE_WINDOW", "0.05"))
+
+# Asynchronous analysis jobs: with ?mode=async (or Prefer: respond-async) a cache miss is queued
+# and answered with 202 + a job id instead of holding the connection for the analyzer call
+FETCH_ASYNC_DEFAULT = env_flag("FETCH_ASYNC_DEFAULT", False)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", str(ANALYZER_MAX_CONCURRENCY)))
+JOB_QUEUE_MAX_SIZE = int(os.getenv("JOB_QUEUE_MAX_SIZE", "1000"))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "600"))
+JOB_EVENTS_KEEPALIVE = float(os.getenv("JOB_EVENTS_KEEPALIVE", "15"))
+
+# Cache warming (POST /api/cache/warm, warm_cache.py): URLs analyzed in parallel, analyzer calls
+# started per second (0 = no limit), URLs per existence check and URLs per request
+WARM_CONCURRENCY = int(os.getenv("WARM_CONCURRENCY", "4"))
+WARM_RATE = float(os.getenv("WARM_RATE", "0"))
+WARM_LOOKUP_BATCH = int(os.getenv("WARM_LOOKUP_BATCH", "500"))
+WARM_MAX_URLS = int(os.getenv("WARM_MAX_URLS", "10000"))
+
+# Strong references to background refresh tasks so they aren't garbage collected
+background_refreshes = set()
+
+# Connection pool settings for the async MongoDB driver
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000"))
+
+# Cache storage backend: mongodb (Atlas), sqlite (local file) or memory (tests/CI, not persisted)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongodb").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "url_cache.sqlite3")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Share of requests whose per-stage timings are logged as one JSON trace line (0 disables)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+
+# Physical cleanup of entries invalidated by /api/cache/clear: every PURGE_INTERVAL seconds (and right
+# after a clear) delete them PURGE_BATCH_SIZE at a time, pausing PURGE_BATCH_PAUSE seconds between batches
+PURGE_INTERVAL = float(os.getenv("PURGE_INTERVAL", "300"))
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "500"))
+PURGE_BATCH_PAUSE = float(os.getenv("PURGE_BATCH_PAUSE", "1"))
+
+# Backoff between background connection attempts (seconds)
+MONGO_CONNECT_RETRY_INITIAL = float(os.getenv("MONGO_CONNECT_RETRY_INITIAL", "1"))
+MONGO_CONNECT_RETRY_MAX = float(os.getenv("MONGO_CONNECT_RETRY_MAX", "60"))
+
+# How often the /api/cache/stats snapshot is recomputed (seconds)
+STATS_REFRESH_INTERVAL = float(os.getenv("STATS_REFRESH_INTERVAL", "30"))
+
+# Background health probe: ping every HEALTH_PROBE_INTERVAL, refresh server info
+# and dbStats every DB_INFO_REFRESH_INTERVAL (seconds)
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "10"))
+DB_INFO_REFRESH_INTERVAL = float(os.getenv("DB_INFO_REFRESH_INTERVAL", "60"))
+
+def create_storage() -> CacheStorage:
+    """Build the configured (not yet connected) storage backend"""
+    if STORAGE_BACKEND == "sqlite":
+        return SQLiteStorage(SQLITE_PATH, mmap_size=SQLITE_MMAP_SIZE)
+    if STORAGE_BACKEND == "memory":
+        return MemoryStorage()
+    if STORAGE_BACKEND != "mongodb":
+        raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND!r} (expected mongodb, sqlite or memory)")
+    return MongoStorage(
+        get_mongo_connection_string,
+        DATABASE_NAME,
+        COLLECTION_NAME,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    )
+
+# Cache storage; storage.connected flips once connect_with_retry() gets an answer
+storage = create_storage()
+storage_last_error = None
+
+# Metrics exposed on /metrics (per worker process)
+REQUEST_SECONDS = Histogram("url_cache_http_request_duration_seconds", "HTTP request latency by route and status",
+                            ["method", "route", "status"])
+STAGE_SECONDS = Histogram("url_cache_stage_duration_seconds", "Latency of each request-handling stage", ["stage"])
+CACHE_LOOKUPS = Counter("url_cache_lookups_total", "Cache lookups by layer and result", ["layer", "result"])
+RESPONSES = Counter("url_cache_responses_total", "Analyses served by source", ["source"])
+ANALYZER_ERRORS = Counter("url_cache_analyzer_errors_total", "Failed analyzer calls by upstream status", ["status"])
+STORAGE_WRITE_ERRORS = Counter("url_cache_storage_write_errors_total", "Analyses that could not be stored")
+RESCORES = Counter("url_cache_rescores_total", "Cached analyses re-scored after a scorer version change")
+PURGED = Counter("url_cache_purged_documents_total", "Invalidated documents physically deleted by the purge job")
+CallbackMetric("url_cache_generation", "Current cache generation (bumped by /api/cache/clear)",
+               lambda: storage.generation)
+CallbackMetric("url_cache_duplicate_key_races_total", "Concurrent inserts of an already cached URL",
+               lambda: storage.duplicate_key_races, kind="counter")
+CallbackMetric("url_cache_l1_entries", "Entries in the in-process L1 cache", lambda: len(l1_cache))
+CallbackMetric("url_cache_l1_bytes", "Approximate size of the L1 cache", lambda: l1_cache.current_bytes)
+CallbackMetric("url_cache_l1_evictions_total", "L1 entries evicted to stay within budget",
+               lambda: l1_cache.evictions, kind="counter")
+CallbackMetric("url_cache_analyzer_circuit_open", "1 while the analyzer circuit breaker is failing fast",
+               lambda: int(analyzer_breaker.state == CircuitBreaker.OPEN))
+CallbackMetric("url_cache_analyzer_circuit_opened_total", "Times the analyzer circuit breaker opened",
+               lambda: analyzer_breaker.times_opened, kind="counter")
+CallbackMetric("url_cache_analyzer_circuit_rejected_total", "Analyzer calls rejected by the open circuit",
+               lambda: analyzer_breaker.rejected, kind="counter")
+CallbackMetric("url_cache_negative_cache_entries", "URLs with a remembered analyzer failure",
+               lambda: len(negative_cache))
+CallbackMetric("url_cache_analyzer_in_flight", "Analyzer calls currently running", lambda: analyzer_client.in_flight)
+CallbackMetric("url_cache_coalesced_misses_in_flight", "Distinct URLs with a miss being analyzed",
+               lambda: len(miss_flights))
+CallbackMetric("url_cache_batch_write_flushes_total", "Bulk writes of batch misses",
+               lambda: batch_writes.flushed_groups, kind="counter")
+CallbackMetric("url_cache_background_refreshes", "Stale entries being refreshed in the background",
+               lambda: len(background_refreshes))
+JOB_WAIT_SECONDS = Histogram("url_cache_job_wait_seconds", "Time analysis jobs spent queued before a worker took them")
+CallbackMetric("url_cache_job_queue_depth", "Analysis jobs waiting for a worker", lambda: analysis_jobs.depth)
+CallbackMetric("url_cache_job_queue_oldest_wait_seconds", "Wait of the longest-queued analysis job",
+               lambda: analysis_jobs.oldest_wait())
+CallbackMetric("url_cache_jobs_running", "Analysis jobs being processed", lambda: analysis_jobs.running)
+CallbackMetric("url_cache_jobs_total", "Finished or rejected analysis jobs by outcome",
+               lambda: {("done",): analysis_jobs.completed, ("failed",): analysis_jobs.failed,
+                        ("rejected",): analysis_jobs.rejected},
+               kind="counter", labelnames=["outcome"])
+CallbackMetric("url_cache_storage_ping_latency_seconds", "Round trip of the health probe's last storage ping",
+               lambda: None if health_snapshot["ping_latency_ms"] is None else health_snapshot["ping_latency_ms"] / 1000)
+CallbackMetric("url_cache_storage_connected", "Whether the storage backend is connected",
+               lambda: int(storage.connected))
+
+app.add_middleware(MetricsMiddleware, histogram=REQUEST_SECONDS, trace_sample_rate=TRACE_SAMPLE_RATE)
+
+@contextmanager
+def stage(name: str):
+    """Time a request-handling stage into STAGE_SECONDS and the sampled trace"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(name).observe(elapsed)
+        record_span(name, elapsed)
+
+def describe_storage() -> str:
+    """Where the cache lives, for log lines"""
+    if storage.name == "mongodb":
+        return f"mongodb+srv://{MONGO_USERNAME}:***@{MONGO_CLUSTER}/{DATABASE_NAME}.{COLLECTION_NAME}"
+    if storage.name == "sqlite":
+        return f"sqlite:{SQLITE_PATH}"
+    return storage.name
+
+async def connect_storage():
+    """Make one connection attempt; the storage only reports connected once the whole setup succeeded
+
+    Until then requests get 503s instead of being served with generation 0
+    (which would resurrect cleared entries) or without the indexes.
+    """
+    global storage_last_error
+    print(f"🔗 Connecting to: {describe_storage()}")
+    await storage.connect()
+    try:
+        server_info = await storage.server_info()
+        generation = await storage.load_generation()
+        await storage.ensure_indexes()
+    except Exception:
+        await storage.close()
+        raise
+    storage_last_error = None
+    health_snapshot["db_status"] = "healthy"
+    health_snapshot["server_info"] = server_info
+    storage.connected = True
+    print(f"✅ Successfully connected to {storage.name} storage!")
+    print(f"📊 Version: {server_info.get('version')}")
+    print(f"🧬 Cache generation: {generation}")
+    print("🗂️  Indexes ensured")
+
+async def connect_with_retry():
+    """Keep trying to connect to the storage backend with exponential backoff until it succeeds"""
+    global storage_last_error
+    delay = MONGO_CONNECT_RETRY_INITIAL
+    while not storage.connected:
+        try:
+            await connect_storage()
+        except Exception as e:
+            storage_last_error = str(e)
+            print(f"❌ Failed to connect to {describe_storage()}: {e} - retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MONGO_CONNECT_RETRY_MAX)
 
 def create_url_hash(url: str) -> str:
     """Create a hash of the URL for use as MongoDB document ID"""
     return hashlib.sha256(url.encode()).hexdigest()
 
-def make_api_call(url: str) -> dict:
-    """Make HTTP GET request to the provided URL"""
+def canonical_url(url: str) -> str:
+    """Canonicalize a requested URL, rejecting ones that can't be analyzed"""
     try:
-        endpoint = "http://127.0.0.1:8000/analyze_cookies"
-        payload={"url": url}
-        response = requests.post(endpoint, json=payload, timeout=300)
-        print("response",response)
-        response.raise_for_status()
-        
-        # Try to parse as JSON, otherwise return text
-        try:
-            data = response.json()
-        except:
-            data = {"text_response": response.text, "status_code": response.status_code}
-        
-        return {
-            "success": True,
-            "data": data,
-            "status_code": response.status_code,
-            "headers": dict(response.headers)
-        }
-    except requests.RequestException as e:
-        return {
-            "success": False,
-            "error": str(e),
-            "status_code": getattr(e.response, 'status_code', None) if hasattr(e, 'response') else None
-        }
+        return url_canonicalizer.canonicalize(url)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid URL {url!r}: {e}")
+
+async def make_api_call(url: str) -> dict:
+    """Send the URL to the cookie analyzer without blocking the event loop"""
+    return await analyzer_client.analyze(url)
+
+def score_analysis(analysis: Optional[dict]) -> dict:
+    """Score an analyzer payload and return the score fields stored with it"""
+    with stage("scoring"):
+        scorer = PrivacyComplianceScorer(analysis or {})
+        score = scorer.calculate_score()
+    return {
+        "privacy_score": score,
+        "score_breakdown": scorer.component_scores,
+        "scorer_version": SCORER_VERSION
+    }
+
+async def ensure_current_score(document: dict, view: str = "full") -> dict:
+    """Recompute and persist the score if it was produced by an older scorer"""
+    if document.get("scorer_version", 0) >= SCORER_VERSION and "privacy_score" in document:
+        return document
+    stored = document
+    if view != "full":
+        # Projected documents don't carry the whole analysis; rescoring needs it
+        stored = await storage.find_one(
+            document["_id"], {"api_response": 1, BLOB_FIELD: 1, FORMAT_FIELD: 1}
+        ) or document
+    analysis = expand(stored).get("api_response")
+    score_fields = score_analysis(analysis)
+    RESCORES.inc()
+    document.update(score_fields)
+    try:
+        await storage.update_fields(document["_id"], score_fields)
+    except Exception as e:
+        # Serving the recomputed score matters more than saving it
+        print(f"⚠️  Failed to persist recomputed score for {document.get('url')}: {e}")
+    return document
 
 @app.get("/")
 async def root():
     """Root endpoint with API information"""
-    connection_status = "✅ Connected" if client else "❌ Not Connected"
+    connection_status = "✅ Connected" if storage.connected else "❌ Not Connected"
     return {
         "message": "URL Cache API (MongoDB Atlas)",
         "description": "Use /api/fetch?url=<your_url> to fetch and cache API responses",
@@ -146,195 +441,912 @@ async def root():
         "database_name": DATABASE_NAME,
         "collection_name": COLLECTION_NAME,
         "cluster": MONGO_CLUSTER,
+        "storage_backend": storage.name,
         "version": "2.0.0"
     }
 
-@app.get("/health")
-async def health_check():
-    """Health check endpoint"""
+# Latest health/info probe results; /health and /api/db/info serve from here
+health_snapshot = {
+    "db_status": "connecting",
+    "ping_latency_ms": None,
+    "pinged_at": None,
+    "server_info": {},
+    "db_stats": {},
+    "info_refreshed_at": None,
+}
+
+def snapshot_age(taken_at: Optional[float]) -> Optional[float]:
+    """Seconds since a monotonic timestamp, or None if never taken"""
+    return round(time.monotonic() - taken_at, 1) if taken_at is not None else None
+
+async def probe_health():
+    """Ping the storage backend, timing the round trip, and record the result"""
+    if not storage.connected:
+        health_snapshot["db_status"] = "disconnected"
+        return
+    started = time.perf_counter()
     try:
-        if client:
-            # Test database connection
-            client.admin.command('ping')
-            db_status = "healthy"
-            
-            # Get additional connection info
-            server_info = client.server_info()
-            db_stats = db.command("dbStats")
-            
-        else:
-            db_status = "disconnected"
-            server_info = {}
-            db_stats = {}
+        await storage.ping()
+        health_snapshot["db_status"] = "healthy"
+        health_snapshot["ping_latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        await sync_generation()
     except Exception as e:
-        db_status = f"error: {str(e)}"
-        server_info = {}
-        db_stats = {}
+        health_snapshot["db_status"] = f"error: {str(e)}"
+        health_snapshot["ping_latency_ms"] = None
+    health_snapshot["pinged_at"] = time.monotonic()
+
+async def sync_generation():
+    """Pick up a generation bumped by another worker and drop this worker's now invalid L1 entries"""
+    previous = storage.generation
+    if await storage.load_generation() != previous:
+        l1_cache.clear()
+        print(f"🧬 Cache generation changed to {storage.generation}, L1 cache dropped")
+
+async def refresh_db_info():
+    """Record server version and dbStats"""
+    if not storage.connected:
+        return
+    health_snapshot["server_info"] = await storage.server_info()
+    health_snapshot["db_stats"] = await storage.stats()
+    health_snapshot["info_refreshed_at"] = time.monotonic()
+
+async def probe_health_periodically():
+    """Background loop keeping the health snapshot current"""
+    while True:
+        await probe_health()
+        info_age = snapshot_age(health_snapshot["info_refreshed_at"])
+        if health_snapshot["db_status"] == "healthy" and (info_age is None or info_age >= DB_INFO_REFRESH_INTERVAL):
+            try:
+                await refresh_db_info()
+            except Exception as e:
+                print(f"⚠️  Failed to refresh database info: {e}")
+        await asyncio.sleep(HEALTH_PROBE_INTERVAL)
+
+@app.get("/health")
+async def health_check():
+    """Health check endpoint (served from the background probe snapshot)"""
+    db_status = health_snapshot["db_status"] if storage.connected else "disconnected"
+    server_info = health_snapshot["server_info"]
+    db_stats = health_snapshot["db_stats"]
     
     return {
         "status": "healthy" if db_status == "healthy" else "unhealthy",
         "database": db_status,
         "timestamp": datetime.utcnow().isoformat(),
+        "storage_backend": storage.name,
         "cluster": MONGO_CLUSTER,
         "database_name": DATABASE_NAME,
         "mongodb_version": server_info.get("version", "unknown"),
-        "database_size_mb": round(db_stats.get("dataSize", 0) / (1024 * 1024), 2) if db_stats else 0
+        "database_size_mb": round(db_stats.get("dataSize", 0) / (1024 * 1024), 2) if db_stats else 0,
+        "analyzer_circuit": analyzer_breaker.state,
+        "last_ping_latency_ms": health_snapshot["ping_latency_ms"],
+        "ping_age_seconds": snapshot_age(health_snapshot["pinged_at"]),
+        "info_age_seconds": snapshot_age(health_snapshot["info_refreshed_at"])
+    }
+
+def is_negative_cacheable(status_code: Optional[int]) -> bool:
+    """Whether an analyzer failure is a property of the URL (4xx) rather than of the analyzer"""
+    if status_code is None or status_code in NEGATIVE_CACHE_EXCLUDED_STATUSES:
+        return False
+    return 400 <= status_code < 500
+
+async def analyze_url(url: str) -> tuple:
+    """Call the analyzer for a URL; returns the scored cache document and its approximate size in bytes"""
+    failure = negative_cache.get(create_url_hash(url))
+    CACHE_LOOKUPS.labels("negative", "hit" if failure else "miss").inc()
+    if failure:
+        raise HTTPException(status_code=failure["status_code"], detail=failure["detail"],
+                            headers={"X-Negative-Cache": "hit"})
+
+    generation = storage.generation
+    with stage("analyzer_call"):
+        api_response = await make_api_call(url)
+    
+    if not api_response["success"]:
+        status_code = api_response.get("status_code")
+        if api_response.get("circuit_open"):
+            ANALYZER_ERRORS.labels("circuit_open").inc()
+            raise HTTPException(
+                status_code=503,
+                detail="Analyzer unavailable, failing fast until it recovers",
+                headers={"Retry-After": str(max(1, round(api_response["retry_after"])))},
+            )
+        ANALYZER_ERRORS.labels(status_code or "network").inc()
+        detail = f"Failed to fetch data from URL: {api_response.get('error')}"
+        if is_negative_cacheable(status_code):
+            negative_cache.set(create_url_hash(url), {"status_code": status_code, "detail": detail})
+        raise HTTPException(status_code=status_code or 502, detail=detail)
+    score_fields = score_analysis(api_response.get("data"))
+    document = {
+        "_id": create_url_hash(url),
+        "url": url,
+        "api_response": api_response.get("data"),
+        "cached_at": datetime.utcnow().isoformat(),
+        # Generation the analysis started in, so a clear during the call still invalidates it
+        GENERATION_FIELD: generation,
+        **score_fields
+    }
+    # The analyzer body is the bulk of the document, so it is measured once here rather than on every L1 set
+    return document, api_response.get("size", 0) + DOCUMENT_HEAD_BYTES
+
+# Ordering of response views, and the Mongo projection that reads just enough for each
+VIEW_LEVELS = {"score": 0, "summary": 1, "full": 2}
+SUMMARY_EXCLUDED_FIELDS = ("network_requests", "before_consent.cookies", "after_consent.cookies")
+VIEW_PROJECTIONS = {
+    "score": {"url": 1, "cached_at": 1, "privacy_score": 1, "score_breakdown": 1, "scorer_version": 1},
+    "summary": {
+        **{f"api_response.{field}": 0 for field in SUMMARY_EXCLUDED_FIELDS},
+        BLOB_FIELD: 0,
+        FORMAT_FIELD: 0,
+    },
+    "full": None,
+}
+
+def summarize_analysis(analysis: Optional[dict]) -> Optional[dict]:
+    """Copy of an analyzer payload without the bulky per-request and per-cookie lists"""
+    if not analysis:
+        return analysis
+    summary = {key: value for key, value in analysis.items() if key != "network_requests"}
+    for phase in ("before_consent", "after_consent"):
+        if isinstance(summary.get(phase), dict):
+            summary[phase] = {key: value for key, value in summary[phase].items() if key != "cookies"}
+    return summary
+
+def remember(url: str, document: dict, view: str = "full", size: Optional[int] = None):
+    """Put a (possibly projected) document in the L1 cache, tagged with the view it can serve"""
+    if document.get(GENERATION_FIELD, storage.generation) < storage.generation:
+        return  # analyzed before a clear; stored but invisible
+    l1_cache.set(create_url_hash(url), {"view": view, "doc": document}, size=size)
+
+def recall(url: str, view: str) -> Optional[dict]:
+    """L1 lookup that only returns entries holding at least the fields the view needs"""
+    with stage("l1_lookup"):
+        entry = l1_cache.get(create_url_hash(url))
+    if entry is not None and VIEW_LEVELS[entry["view"]] >= VIEW_LEVELS[view]:
+        CACHE_LOOKUPS.labels("l1", "hit").inc()
+        return entry["doc"]
+    CACHE_LOOKUPS.labels("l1", "miss").inc()
+    return None
+
+def build_response(document: dict, source: str, view: str = "full") -> dict:
+    """Shape a cached document into the /api/fetch response body"""
+    response = {
+        "privacy_score": document["privacy_score"],
+        "score_breakdown": document["score_breakdown"],
+        "source": source,
+        "url": document["url"],
+        "cached_at": document.get("cached_at"),
+    }
+    if view == "full":
+        # Compressed documents are only expanded here, when the full payload is asked for
+        response["api_response"] = expand(document).get("api_response")
+    elif view == "summary":
+        response["api_response"] = summarize_analysis(document.get("api_response"))
+    return response
+
+async def json_response(content, request: Request, status_code: int = 200,
+                        headers: Optional[dict] = None) -> Response:
+    """Serialize with orjson, gzipping large bodies when the client accepts it"""
+    with stage("serialize"):
+        body = orjson.dumps(content)
+    headers = {**(headers or {}), "Vary": "Accept-Encoding"}
+    if len(body) >= GZIP_MIN_SIZE and "gzip" in request.headers.get("accept-encoding", ""):
+        # Full analyses can be hundreds of KB; compress off the event loop
+        with stage("compress"):
+            body = await asyncio.to_thread(gzip.compress, body, GZIP_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+    return Response(body, status_code=status_code, media_type="application/json", headers=headers)
+
+def compute_etag(url: str, cached_at: str, view: str) -> str:
+    """Validator for a cached analysis: it only changes when the URL is re-analyzed or the scorer changes"""
+    digest = hashlib.sha1(f"{url}|{cached_at}|{SCORER_VERSION}|{view}".encode("utf-8")).hexdigest()
+    # Weak, because gzipped and plain bodies share it
+    return f'W/"{digest[:20]}"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against our ETag"""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:]
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith("W/") else tag) == opaque:
+            return True
+    return False
+
+def caching_headers(url: str, cached_at: Optional[str], view: str) -> dict:
+    """ETag, Last-Modified and Cache-Control for a stored analysis"""
+    if not cached_at:
+        return {"Cache-Control": "no-store"}
+    headers = {
+        "ETag": compute_etag(url, cached_at, view),
+        "Cache-Control": f"private, max-age={HTTP_CACHE_MAX_AGE}",
     }
+    try:
+        modified = datetime.fromisoformat(cached_at).replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(modified, usegmt=True)
+    except ValueError:
+        pass
+    return headers
+
+async def check_not_modified(url: str, view: str, if_none_match: str) -> Optional[Response]:
+    """304 response if the client's ETag still matches, using only the key and cached_at"""
+    # Any L1 entry has cached_at; otherwise read just that field from storage
+    stored = recall(url, "score")
+    if stored is None:
+        with stage("revalidate_lookup"):
+            stored = await storage.find_one(create_url_hash(url), {"cached_at": 1})
+    if not stored:
+        return None
+    freshness = classify_freshness(stored)
+    if freshness == "expired":
+        return None
+    headers = caching_headers(url, stored.get("cached_at"), view)
+    if "ETag" not in headers or not etag_matches(if_none_match, headers["ETag"]):
+        return None
+    if freshness == "stale":
+        schedule_refresh(url)
+    RESPONSES.labels("not_modified").inc()
+    annotate(source="not_modified")
+    return Response(status_code=304, headers=headers)
+
+async def save_documents(documents: List[dict]) -> dict:
+    """Upsert a group of encoded documents with one unordered bulk write; returns _id -> error"""
+    with stage("storage_write"):
+        return await storage.bulk_replace(documents)
+
+# Groups the writes of batch misses that finish close together
+batch_writes = WriteBatcher(save_documents, max_size=BATCH_WRITE_MAX_DOCS, window=BATCH_WRITE_WINDOW)
+
+async def fetch_and_cache(url: str, batched: bool = False) -> tuple:
+    """Call the analyzer for a cache miss and save the result; returns (document, write warning)
+
+    With batched, the write joins the next bulk write of batch_writes instead of its own upsert.
+    """
+    document, size = await analyze_url(url)
+    
+    error = None
+    if batched:
+        error = await batch_writes.write(storage_codec.encode(document))
+    else:
+        try:
+            # Upsert so refreshes of stale entries replace the old analysis
+            with stage("storage_write"):
+                await storage.replace(storage_codec.encode(document))
+        except Exception as e:
+            error = str(e)
+    if error:
+        # If the write fails, still return the API response
+        STORAGE_WRITE_ERRORS.inc()
+        return document, f"Failed to cache response in {storage.name} storage: {error}"
+    remember(url, document, size=size)
+    return document, None
+
+async def run_analysis_job(url: str) -> tuple:
+    """Job handler: analyze and store a URL, sharing the call with concurrent synchronous misses"""
+    return await miss_flights.do(url, lambda: fetch_and_cache(url))
+
+analysis_jobs = JobQueue(
+    run_analysis_job,
+    workers=JOB_WORKERS,
+    max_size=JOB_QUEUE_MAX_SIZE,
+    result_ttl=JOB_RESULT_TTL,
+    on_start=JOB_WAIT_SECONDS.observe,
+)
+
+def job_payload(job: Job, view: str = "full") -> dict:
+    """Job status, plus the analysis once it is done or the error if it failed"""
+    payload = {**job.describe(), "url": job.key}
+    if job.status == "done":
+        document, warning = job.result
+        if warning:
+            payload["result"] = {**build_response(document, "api_call_only", view), "warning": warning}
+        else:
+            payload["result"] = build_response(document, "fresh_api_call", view)
+    elif job.status == "failed":
+        error = job.error
+        if isinstance(error, HTTPException):
+            payload["error"] = {"status_code": error.status_code, "detail": error.detail}
+        else:
+            payload["error"] = {"status_code": 500, "detail": str(error)}
+    return payload
+
+def enqueue_analysis(url: str) -> Response:
+    """Queue a cache miss as a job and answer 202 with where to follow it"""
+    try:
+        job = analysis_jobs.submit(url)
+    except QueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Analysis queue is full, retry later",
+            headers={"Retry-After": "5"},
+        )
+    RESPONSES.labels("queued").inc()
+    annotate(source="queued", job_id=job.id)
+    status_url = f"/api/jobs/{job.id}"
+    return ORJSONResponse(
+        {**job_payload(job), "status_url": status_url, "events_url": f"{status_url}/events"},
+        status_code=202,
+        headers={"Location": status_url, "Retry-After": "1", "Cache-Control": "no-store"},
+    )
+
+def wants_async(mode: Optional[str], prefer: Optional[str]) -> bool:
+    """Whether a miss should be answered with a job instead of waiting for the analyzer"""
+    if mode is not None:
+        return mode == "async"
+    if prefer and "respond-async" in prefer.lower():
+        return True
+    return FETCH_ASYNC_DEFAULT
+
+def classify_freshness(document: dict) -> str:
+    """Return 'fresh', 'stale' or 'expired' for a cached document based on cached_at"""
+    if CACHE_MAX_AGE <= 0:
+        return "fresh"
+    try:
+        age = (datetime.utcnow() - datetime.fromisoformat(document["cached_at"])).total_seconds()
+    except (KeyError, TypeError, ValueError):
+        return "expired"
+    if age <= CACHE_MAX_AGE:
+        return "fresh"
+    if age <= CACHE_MAX_AGE + CACHE_STALE_WINDOW:
+        return "stale"
+    return "expired"
+
+async def refresh_in_background(url: str):
+    """Re-analyze a stale URL, sharing the call with any concurrent misses"""
+    try:
+        await miss_flights.do(url, lambda: fetch_and_cache(url))
+    except Exception as e:
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        print(f"⚠️  Background refresh failed for {url}: {detail}")
+
+def schedule_refresh(url: str):
+    """Start a background refresh unless one is already running for this URL"""
+    if miss_flights.in_flight(url):
+        return
+    task = asyncio.create_task(refresh_in_background(url))
+    background_refreshes.add(task)
+    task.add_done_callback(background_refreshes.discard)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics for this worker process"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness probe: the worker is up and its event loop is responsive"""
+    return {"status": "alive", "timestamp": datetime.utcnow().isoformat()}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness probe: the worker has an established storage connection"""
+    if not storage.connected:
+        raise HTTPException(
+            status_code=503,
+            detail={"status": "not_ready", "database": "connecting", "last_error": storage_last_error}
+        )
+    if health_snapshot["db_status"].startswith("error"):
+        raise HTTPException(
+            status_code=503,
+            detail={"status": "not_ready", "database": health_snapshot["db_status"]}
+        )
+    return {"status": "ready", "database": "connected"}
 
 @app.post("/api/fetch")
-async def fetch_url_data(body: AnalyzeRequest):
+async def fetch_url_data(body: AnalyzeRequest, request: Request, view: ResponseView = Query("full"),
+                         mode: Optional[FetchMode] = Query(None), prefer: Optional[str] = Header(None)):
+    """Fetch a URL's analysis (JSON body variant)"""
+    return await serve_fetch(canonical_url(body.url), view, request, wants_async(mode, prefer))
+
+@app.get("/api/fetch")
+async def fetch_url_data_get(request: Request, url: str = Query(...), view: ResponseView = Query("full"),
+                             mode: Optional[FetchMode] = Query(None), prefer: Optional[str] = Header(None)):
+    """Fetch a URL's analysis (query string variant, cacheable by browsers and proxies)"""
+    return await serve_fetch(canonical_url(url), view, request, wants_async(mode, prefer))
+
+async def serve_fetch(url: str, view: str, request: Request, respond_async: bool = False) -> Response:
     """
     Main endpoint that:
     1. Checks if URL response exists in MongoDB Atlasclera
-    2. If exists, returns cached response
-    3. If not exists, makes API call, saves to MongoDB Atlas, and returns response
+    2. If exists and fresh, returns cached response ("cache")
+    3. If exists but stale, returns it and refreshes in the background ("cache_stale")
+    4. If expired, re-analyzes before responding ("cache_expired_refresh")
+    5. If not exists, makes API call, saves to MongoDB Atlas, and returns response ("fresh_api_call")
+    With respond_async, steps 4 and 5 are queued instead and answered with 202 and a job id.
+    
+    view=score|summary|full selects how much of the analysis is read from Atlas and returned.
+    A matching If-None-Match is answered with 304 before the payload is loaded or re-scored.
     """
     
     # Check if MongoDB is connected
-   
+    if not storage.connected:
+        raise HTTPException(status_code=503, detail="Database not available")
 
     try:
-        url = body.url
-        print(f"Fetching cached_response")
-        query = {"url": url}
-        # Check if URL exists in MongoDB Atlas
-        cached_response = collection.find_one(query)
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            not_modified = await check_not_modified(url, view, if_none_match)
+            if not_modified is not None:
+                return not_modified
+        # Check the in-process L1 cache first, then the storage backend (reading only what the view needs)
+        cached_response = recall(url, view)
+        if cached_response is None:
+            with stage("storage_lookup"):
+                cached_response = await storage.find_one(create_url_hash(url), VIEW_PROJECTIONS[view])
+            CACHE_LOOKUPS.labels("storage", "hit" if cached_response else "miss").inc()
+            if cached_response:
+                remember(url, cached_response, view)
         
-        if cached_response:
-            # URL found in cache
-            scorer = PrivacyComplianceScorer(cached_response.get("api_response"))
-            score = scorer.calculate_score()
-            return {
-                "privacy_score": score,
-                "source": "cache",
-                "url": url,
-                "cached_at": cached_response.get("cached_at"),
-                "api_response": cached_response.get("api_response"),
-            }
-        
-        # URL not in cache - make API call
-        api_response = make_api_call(url)
-        
-        if not api_response["success"]:
-            raise HTTPException(
-                status_code=api_response.get("status_code", 500),
-                detail=f"Failed to fetch data from URL: {api_response.get('error')}"
+        freshness = classify_freshness(cached_response) if cached_response else None
+        if freshness in ("fresh", "stale"):
+            # URL found in cache - reuse the stored score unless the scorer changed since
+            cached_response = await ensure_current_score(cached_response, view)
+            if freshness == "stale":
+                schedule_refresh(url)
+            source = "cache" if freshness == "fresh" else "cache_stale"
+            RESPONSES.labels(source).inc()
+            annotate(source=source)
+            return await json_response(
+                build_response(cached_response, source, view), request,
+                headers=caching_headers(url, cached_response.get("cached_at"), view),
             )
-        scorer = PrivacyComplianceScorer(api_response)
-        score = scorer.calculate_score()
-        # Save response to MongoDB Atlas
-        document = {
-            "_id": url,
-            "url": url,
-            "api_response": api_response.get("data"),
-            "cached_at": datetime.utcnow().isoformat()
-        }
         
-        try:
-            collection.insert_one(document)
-        except Exception as e:
-            # If MongoDB insert fails, still return the API response
-            return {
-                "source": "api_call_only",
-                "url": url,
-                "api_response": api_response,
-                "warning": f"Failed to cache response in Atlas: {str(e)}"
-            }
-        
-        # Return the fresh API responses
-        return {
-            "privacy_score": score,
-            "source": "fresh_api_call",
-            "url": url,
-            "cached_at": document["cached_at"],
-            "api_response": api_response.get("data")
-        }
+        if respond_async:
+            return enqueue_analysis(url)
+        # URL not in cache (or expired) - coalesce concurrent misses into one analyzer call
+        document, warning = await miss_flights.do(url, lambda: fetch_and_cache(url))
+        if warning:
+            # Not stored, so there is nothing a client could revalidate against
+            result = {**build_response(document, "api_call_only", view), "warning": warning}
+            RESPONSES.labels("api_call_only").inc()
+            annotate(source="api_call_only")
+            return await json_response(result, request, headers={"Cache-Control": "no-store"})
+        source = "cache_expired_refresh" if freshness == "expired" else "fresh_api_call"
+        RESPONSES.labels(source).inc()
+        annotate(source=source)
+        return await json_response(
+            build_response(document, source, view), request,
+            headers=caching_headers(url, document.get("cached_at"), view),
+        )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, 
             detail=f"Database operation failed: {str(e)}"
         )
 
+@app.get("/api/jobs")
+async def get_job_queue_stats():
+    """Depth, wait and throughput of the analysis job queue (this worker)"""
+    return {
+        "queued": analysis_jobs.depth,
+        "running": analysis_jobs.running,
+        "workers": analysis_jobs.workers,
+        "max_queued": analysis_jobs.max_size,
+        "oldest_wait_seconds": round(analysis_jobs.oldest_wait(), 3),
+        "completed": analysis_jobs.completed,
+        "failed": analysis_jobs.failed,
+        "rejected": analysis_jobs.rejected,
+    }
+
+def find_job(job_id: str) -> Job:
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        # Jobs live in the worker that accepted them and are forgotten JOB_RESULT_TTL after finishing
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, request: Request, view: ResponseView = Query("full")):
+    """Poll an analysis job; the result is included once its status is done"""
+    job = find_job(job_id)
+    headers = {"Cache-Control": "no-store"}
+    if not job.finished:
+        headers["Retry-After"] = "1"
+    return await json_response(job_payload(job, view), request, headers=headers)
+
+@app.get("/api/jobs/{job_id}/events")
+async def get_job_events(job_id: str, view: ResponseView = Query("full")):
+    """Server-sent events for a job: status changes, then one done/failed event with the payload"""
+    job = find_job(job_id)
+
+    async def events():
+        status = job.status
+        yield b"event: status\ndata: " + orjson.dumps(job.describe()) + b"\n\n"
+        while not await job.wait(JOB_EVENTS_KEEPALIVE):
+            if job.status != status:
+                status = job.status
+                yield b"event: status\ndata: " + orjson.dumps(job.describe()) + b"\n\n"
+            else:
+                yield b": keepalive\n\n"
+        yield f"event: {job.status}\ndata: ".encode() + orjson.dumps(job_payload(job, view)) + b"\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"})
+
+async def run_batch(urls: List[str], view: str = "full") -> AsyncIterator[dict]:
+    """Yield one result per (canonical) URL as soon as it is available, cache hits first"""
+    results_by_url = {}
+    pending = []
+    for url in urls:
+        cached = recall(url, view)
+        if cached is not None:
+            results_by_url[url] = cached
+        else:
+            pending.append(url)
+    
+    # One round trip for every URL the L1 cache didn't have
+    if pending:
+        keys = [create_url_hash(url) for url in pending]
+        with stage("storage_lookup"):
+            async for doc in storage.find_many(keys, VIEW_PROJECTIONS[view]):
+                results_by_url[doc["url"]] = doc
+                remember(doc["url"], doc, view)
+        found = sum(1 for url in pending if url in results_by_url)
+        CACHE_LOOKUPS.labels("storage", "hit").inc(found)
+        CACHE_LOOKUPS.labels("storage", "miss").inc(len(pending) - found)
+    
+    misses = []
+    for url in urls:
+        document = results_by_url.get(url)
+        freshness = classify_freshness(document) if document else None
+        if freshness in ("fresh", "stale"):
+            document = await ensure_current_score(document, view)
+            if freshness == "stale":
+                schedule_refresh(url)
+            source = "cache" if freshness == "fresh" else "cache_stale"
+            RESPONSES.labels(source).inc()
+            yield {"status": "ok", **build_response(document, source, view)}
+        else:
+            misses.append((url, freshness))
+    
+    if not misses:
+        return
+    
+    semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+    
+    async def analyze_limited(url: str, freshness: Optional[str]):
+        async with semaphore:
+            try:
+                # Same single-flight path as /api/fetch, so the miss coalesces with concurrent misses
+                # for the URL from any endpoint. Each analysis is stored as it finishes, grouped with
+                # the others finishing within BATCH_WRITE_WINDOW into one bulk write; the flight and
+                # the write run in their own tasks, so a disconnecting client can't drop them
+                document, warning = await miss_flights.do(url, lambda: fetch_and_cache(url, batched=True))
+                return url, freshness, document, warning, None
+            except HTTPException as e:
+                return url, freshness, None, None, {"status_code": e.status_code, "error": e.detail}
+            except Exception as e:
+                return url, freshness, None, None, {"status_code": 500, "error": str(e)}
+    
+    for next_done in asyncio.as_completed([analyze_limited(url, freshness) for url, freshness in misses]):
+        url, freshness, document, warning, error = await next_done
+        if error:
+            yield {"status": "error", "url": url, **error}
+        elif warning:
+            RESPONSES.labels("api_call_only").inc()
+            yield {"status": "ok", **build_response(document, "api_call_only", view), "warning": warning}
+        else:
+            source = "cache_expired_refresh" if freshness == "expired" else "fresh_api_call"
+            RESPONSES.labels(source).inc()
+            yield {"status": "ok", **build_response(document, source, view)}
+
+@app.post("/api/fetch/batch")
+async def fetch_batch(body: BatchAnalyzeRequest, request: Request):
+    """
+    Score many URLs in one request:
+    cached entries are looked up with a single $in query, misses are analyzed in
+    parallel (BATCH_MAX_CONCURRENCY) through the single-flight miss path and stored
+    in small unordered bulk writes as they finish.
+    With stream=true results are sent as NDJSON lines in completion order.
+    """
+    if not storage.connected:
+        raise HTTPException(status_code=503, detail="Database not available")
+    # Equivalent URLs collapse into one result, reported under the canonical URL with the
+    # spellings that were asked for in requested_urls; an invalid URL only fails its own entry
+    requested = {}  # canonical URL (or the invalid URL itself) -> requested spellings, in request order
+    invalid = {}
+    for url in body.urls:
+        try:
+            key = url_canonicalizer.canonicalize(url)
+        except ValueError as e:
+            key = url
+            invalid[url] = {"status": "error", "url": url, "status_code": 422, "error": f"Invalid URL {url!r}: {e}"}
+        requested.setdefault(key, {})[url] = None
+    if not requested:
+        raise HTTPException(status_code=422, detail="No URLs provided")
+    if len(requested) > BATCH_MAX_URLS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_URLS} URLs per batch")
+    urls = [key for key in requested if key not in invalid]
+    
+    def with_requested(result: dict) -> dict:
+        return {**result, "requested_urls": list(requested[result["url"]])}
+    
+    if body.stream:
+        async def ndjson_lines():
+            for result in invalid.values():
+                yield orjson.dumps(with_requested(result)) + b"\n"
+            async for result in run_batch(urls, body.view):
+                yield orjson.dumps(with_requested(result)) + b"\n"
+        return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+    
+    try:
+        results = dict(invalid)
+        async for result in run_batch(urls, body.view):
+            results[result["url"]] = result
+        ordered = [with_requested(results[key]) for key in requested]
+        return await json_response({
+            "results": ordered,
+            "total": len(ordered),
+            "succeeded": sum(1 for r in ordered if r["status"] == "ok"),
+            "failed": sum(1 for r in ordered if r["status"] == "error")
+        }, request)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch operation failed: {str(e)}")
+
+async def compute_stats_snapshot() -> dict:
+    """Collect collection statistics using cheap, index-backed operations"""
+    total_cached = await storage.estimated_count()
+    recent_urls = await storage.recent(5)
+    
+    # Reuse the health probe's dbStats when it has one
+    db_stats = health_snapshot["db_stats"] or await storage.stats()
+    
+    return {
+        "total_cached_urls": total_cached,
+        "recent_cached_urls": recent_urls,
+        "database_info": {
+            "cluster": MONGO_CLUSTER,
+            "database": DATABASE_NAME,
+            "collection": COLLECTION_NAME,
+            "storage_backend": storage.name,
+            "database_size_mb": round(db_stats.get("dataSize", 0) / (1024 * 1024), 2),
+            "document_count": db_stats.get("objects", 0)
+        }
+    }
+
+# Latest stats snapshot and the monotonic time it was taken
+stats_snapshot = None
+stats_snapshot_taken_at = 0.0
+
+async def refresh_stats_snapshot():
+    """Recompute and publish the stats snapshot"""
+    global stats_snapshot, stats_snapshot_taken_at
+    stats_snapshot = await compute_stats_snapshot()
+    stats_snapshot_taken_at = time.monotonic()
+
+async def refresh_stats_periodically():
+    """Background loop keeping the stats snapshot at most STATS_REFRESH_INTERVAL old"""
+    while True:
+        if storage.connected:
+            try:
+                await refresh_stats_snapshot()
+            except Exception as e:
+                print(f"⚠️  Failed to refresh cache stats: {e}")
+        await asyncio.sleep(STATS_REFRESH_INTERVAL)
+
+async def warm_urls(urls: List[str], concurrency: int, rate: float, force: bool = False) -> AsyncIterator[dict]:
+    """Bring (canonical) URLs into the cache through the normal miss path, yielding progress events
+
+    Fresh entries are found with batched existence checks and skipped (or only
+    re-scored if the scorer changed); everything else is analyzed with at most
+    `concurrency` calls in flight and at most `rate` calls started per second.
+    """
+    started = time.monotonic()
+    existing = {}
+    if not force:
+        for i in range(0, len(urls), WARM_LOOKUP_BATCH):
+            keys = [create_url_hash(url) for url in urls[i:i + WARM_LOOKUP_BATCH]]
+            async for doc in storage.find_many(keys, VIEW_PROJECTIONS["score"]):
+                existing[doc["url"]] = doc
+
+    work = []
+    skipped = 0
+    for url in urls:
+        document = existing.get(url)
+        if document is not None and classify_freshness(document) == "fresh":
+            if document.get("scorer_version", 0) >= SCORER_VERSION and "privacy_score" in document:
+                skipped += 1
+                continue
+            work.append((url, document))
+        else:
+            work.append((url, None))
+    rescores = sum(1 for _, document in work if document is not None)
+    yield {"event": "plan", "total": len(urls), "skipped_fresh": skipped,
+           "rescore": rescores, "analyze": len(work) - rescores}
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    next_start = time.monotonic()
+
+    async def wait_for_rate_slot():
+        nonlocal next_start
+        if rate <= 0:
+            return
+        now = time.monotonic()
+        slot = max(now, next_start)
+        next_start = slot + 1 / rate
+        await asyncio.sleep(slot - now)
+
+    async def warm_one(url: str, document: Optional[dict]) -> dict:
+        async with semaphore:
+            try:
+                if document is not None:
+                    # Fresh analysis from an older scorer: re-scoring needs no analyzer call
+                    await ensure_current_score(document, "score")
+                    return {"url": url, "result": "rescored"}
+                await wait_for_rate_slot()
+                _, warning = await miss_flights.do(url, lambda: fetch_and_cache(url))
+                if warning:
+                    return {"url": url, "result": "error", "error": warning}
+                return {"url": url, "result": "analyzed"}
+            except HTTPException as e:
+                return {"url": url, "result": "error", "status_code": e.status_code, "error": e.detail}
+            except Exception as e:
+                return {"url": url, "result": "error", "status_code": 500, "error": str(e)}
+
+    counts = {"analyzed": 0, "rescored": 0, "error": 0}
+    for done, next_done in enumerate(asyncio.as_completed([warm_one(url, doc) for url, doc in work]), 1):
+        outcome = await next_done
+        counts[outcome["result"]] += 1
+        elapsed = time.monotonic() - started
+        remaining = len(work) - done
+        yield {"event": "progress", **outcome, "done": done, "remaining": remaining,
+               "elapsed_seconds": round(elapsed, 1), "eta_seconds": round(elapsed / done * remaining, 1)}
+
+    yield {"event": "done", "total": len(urls), "skipped_fresh": skipped, **counts,
+           "elapsed_seconds": round(time.monotonic() - started, 1)}
+
+@app.post("/api/cache/warm")
+async def warm_cache(body: WarmCacheRequest):
+    """
+    Pre-populate the cache from a URL list and/or the `recent` most recently cached URLs.
+    Streams NDJSON progress: one plan line, one line per warmed URL with an ETA, one done line.
+    """
+    if not storage.connected:
+        raise HTTPException(status_code=503, detail="Database not available")
+    urls = []
+    invalid = []
+    for url in body.urls:
+        try:
+            urls.append(url_canonicalizer.canonicalize(url))
+        except ValueError as e:
+            invalid.append({"event": "progress", "url": url, "result": "error", "status_code": 422, "error": str(e)})
+    if body.recent > 0:
+        urls.extend(doc["url"] for doc in await storage.recent(body.recent) if doc.get("url"))
+    urls = list(dict.fromkeys(urls))
+    if not urls and not invalid:
+        raise HTTPException(status_code=422, detail="Provide urls and/or recent")
+    if len(urls) > WARM_MAX_URLS:
+        raise HTTPException(status_code=413, detail=f"At most {WARM_MAX_URLS} URLs per warm-up")
+    concurrency = body.concurrency or WARM_CONCURRENCY
+    rate = body.rate if body.rate is not None else WARM_RATE
+    print(f"🔥 Warming {len(urls)} URLs (concurrency {concurrency}, {f'{rate:g} calls/s' if rate > 0 else 'no rate limit'})")
+
+    async def ndjson_lines():
+        for event in invalid:
+            yield orjson.dumps(event) + b"\n"
+        async for event in warm_urls(urls, concurrency, rate, body.force):
+            if event["event"] == "done":
+                print(f"🔥 Warm-up finished: {event['analyzed']} analyzed, {event['rescored']} re-scored, "
+                      f"{event['skipped_fresh']} already fresh, {event['error']} failed in {event['elapsed_seconds']}s")
+            yield orjson.dumps(event) + b"\n"
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
 @app.get("/api/cache/stats")
 async def get_cache_stats():
-    """Get statistics about cached URLs"""
-    if not collection:
+    """Get statistics about cached URLs (served from a periodically refreshed snapshot)"""
+    if not storage.connected:
         raise HTTPException(status_code=503, detail="Database not available")
     
     try:
-        total_cached = collection.count_documents({})
-        recent_cached = collection.find().sort("cached_at", -1).limit(5)
-        
-        recent_urls = []
-        for doc in recent_cached:
-            recent_urls.append({
-                "url": doc.get("url"),
-                "cached_at": doc.get("cached_at")
-            })
-        
-        # Get database statistics
-        db_stats = db.command("dbStats")
-        
+        if stats_snapshot is None:
+            await refresh_stats_snapshot()
         return {
-            "total_cached_urls": total_cached,
-            "recent_cached_urls": recent_urls,
-            "database_info": {
-                "cluster": MONGO_CLUSTER,
-                "database": DATABASE_NAME,
-                "collection": COLLECTION_NAME,
-                "database_size_mb": round(db_stats.get("dataSize", 0) / (1024 * 1024), 2),
-                "document_count": db_stats.get("objects", 0)
-            }
+            **stats_snapshot,
+            "snapshot_age_seconds": round(time.monotonic() - stats_snapshot_taken_at, 1),
+            "l1_cache": l1_cache.stats(),
+            "negative_cache": negative_cache.stats()
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get cache stats: {str(e)}")
 
 @app.delete("/api/cache/clear")
 async def clear_cache():
-    """Clear all cached responses"""
-    if not collection:
+    """
+    Clear all cached responses by starting a new cache generation.
+    Older entries stop being served at once (in other workers after their next health probe)
+    and are deleted later by the throttled background purge.
+    """
+    global stats_snapshot
+    if not storage.connected:
         raise HTTPException(status_code=503, detail="Database not available")
     
     try:
-        result = collection.delete_many({})
+        generation = await storage.bump_generation()
+        l1_cache.clear()
+        negative_cache.clear()
+        # Force the next /api/cache/stats call to recompute instead of reporting pre-clear numbers
+        stats_snapshot = None
+        purge_requested.set()
         return {
-            "message": f"Cache cleared successfully. Deleted {result.deleted_count} documents from Atlas.",
-            "deleted_count": result.deleted_count
+            "message": f"Cache cleared successfully. Started generation {generation}; "
+                       f"older entries are no longer served and are purged in the background.",
+            "generation": generation
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to clear cache: {str(e)}")
 
+# Set by /api/cache/clear so the purge starts without waiting for PURGE_INTERVAL
+purge_requested = asyncio.Event()
+
+async def purge_old_generations() -> int:
+    """Delete documents of earlier generations in throttled batches; returns how many were removed"""
+    purged = 0
+    while storage.connected:
+        deleted = await storage.purge_generations(PURGE_BATCH_SIZE)
+        purged += deleted
+        PURGED.inc(deleted)
+        if deleted < PURGE_BATCH_SIZE:
+            break
+        await asyncio.sleep(PURGE_BATCH_PAUSE)
+    return purged
+
+async def purge_generations_periodically():
+    """Background loop removing invalidated documents, paced so it never competes with live traffic"""
+    while True:
+        try:
+            await asyncio.wait_for(purge_requested.wait(), PURGE_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        purge_requested.clear()
+        if not storage.connected or storage.generation == 0:
+            continue
+        try:
+            purged = await purge_old_generations()
+            if purged:
+                print(f"🧹 Purged {purged} documents from earlier cache generations")
+        except Exception as e:
+            print(f"⚠️  Failed to purge old cache generations: {e}")
+
 @app.delete("/api/cache/url")
 async def clear_url_cache(url: str = Query(..., description="The URL to remove from cache")):
     """Clear cache for a specific URL"""
-    if not collection:
+    if not storage.connected:
         raise HTTPException(status_code=503, detail="Database not available")
     
+    url = canonical_url(url)
     url_hash = create_url_hash(url)
     
     try:
-        result = collection.delete_one({"_id": url_hash})
-        if result.deleted_count == 0:
+        deleted = await storage.delete(url_hash)
+        l1_cache.delete(url_hash)
+        negative_cache.delete(url_hash)
+        if not deleted:
             return {"message": f"URL not found in cache: {url}"}
         else:
-            return {"message": f"Successfully removed URL from Atlas cache: {url}"}
+            return {"message": f"Successfully removed URL from {storage.name} cache: {url}"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to remove URL from cache: {str(e)}")
 
 @app.get("/api/db/info")
 async def get_database_info():
-    """Get MongoDB Atlas database information"""
-    if not client:
+    """Get MongoDB Atlas database information (served from the background probe snapshot)"""
+    if not storage.connected:
         raise HTTPException(status_code=503, detail="Database not available")
     
     try:
-        # Get database stats
-        db_stats = db.command("dbStats")
-        server_info = client.server_info()
+        if health_snapshot["info_refreshed_at"] is None:
+            await refresh_db_info()
+        db_stats = health_snapshot["db_stats"]
+        server_info = health_snapshot["server_info"]
         
         return {
             "connection_status": "connected",
+            "storage_backend": storage.name,
             "cluster": MONGO_CLUSTER,
             "database_name": DATABASE_NAME,
             "collection_name": COLLECTION_NAME,
@@ -342,7 +1354,9 @@ async def get_database_info():
             "database_size_mb": round(db_stats.get("dataSize", 0) / (1024 * 1024), 2),
             "document_count": db_stats.get("objects", 0),
             "indexes": db_stats.get("indexes", 0),
-            "storage_size_mb": round(db_stats.get("storageSize", 0) / (1024 * 1024), 2)
+            "storage_size_mb": round(db_stats.get("storageSize", 0) / (1024 * 1024), 2),
+            "last_ping_latency_ms": health_snapshot["ping_latency_ms"],
+            "info_age_seconds": snapshot_age(health_snapshot["info_refreshed_at"])
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get database info: {str(e)}")
@@ -358,16 +1372,12 @@ if __name__ == "__main__":
     print(f"Cluster: {MONGO_CLUSTER}")
     print("="*60)
     
-    if client:
-        print("✅ MongoDB Atlas connection successful")
-    else:
-        print("❌ MongoDB Atlas connection failed")
-        print("Please check your credentials in the .env file")
-        print("Make sure to replace 'your_password_here' with your actual password")
+    print(f"💾 Storage backend: {STORAGE_BACKEND}")
+    print("🔍 The storage connection is established in the background after startup")
     
     print("\n🌐 Starting server on http://localhost:8001")
     print("📚 API Documentation: http://localhost:8001/docs")
-    print("🏥 Health Check: http://localhost:801/health")
+    print("🏥 Health Check: http://localhost:8001/health (probes: /health/live, /health/ready)")
     print("📊 Database Info: http://localhost:8001/api/db/info")
     print("\n")
     
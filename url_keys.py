@@ -0,0 +1,68 @@
+# URL canonicalization so equivalent URLs share one cache entry
+from fnmatch import fnmatchcase
+from typing import Iterable
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that only identify the campaign/click, never the page itself
+DEFAULT_TRACKING_PARAMS = (
+    "utm_*", "gclid", "dclid", "gbraid", "wbraid", "fbclid", "msclkid", "yclid",
+    "mc_cid", "mc_eid", "_ga", "_gl", "igshid", "ref_src", "spm",
+)
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+class URLCanonicalizer:
+    """Normalizes URLs before they are used as cache keys
+
+    Always lowercases the scheme and host, drops default ports and fragments
+    and assumes https:// when no scheme is given. Tracking-parameter
+    stripping, query sorting and trailing-slash removal are configurable,
+    and origin_only keys every page of a site to its origin.
+    """
+
+    def __init__(self, strip_tracking: bool = True, tracking_params: Iterable[str] = DEFAULT_TRACKING_PARAMS,
+                 sort_query: bool = True, strip_trailing_slash: bool = True, origin_only: bool = False):
+        self.strip_tracking = strip_tracking
+        self.tracking_params = tuple(p.strip().lower() for p in tracking_params if p.strip())
+        self.sort_query = sort_query
+        self.strip_trailing_slash = strip_trailing_slash
+        self.origin_only = origin_only
+
+    def is_tracking_param(self, name: str) -> bool:
+        name = name.lower()
+        return any(fnmatchcase(name, pattern) for pattern in self.tracking_params)
+
+    def canonicalize(self, url: str) -> str:
+        """Canonical form of an http(s) URL; raises ValueError for anything else"""
+        url = url.strip()
+        if "://" not in url:
+            url = "https://" + url
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in DEFAULT_PORTS:
+            raise ValueError(f"Unsupported URL scheme: {parts.scheme!r}")
+        host = (parts.hostname or "").rstrip(".")
+        if not host:
+            raise ValueError(f"URL has no host: {url!r}")
+        if ":" in host:
+            host = f"[{host}]"  # IPv6 literal
+        port = parts.port  # raises ValueError for out-of-range ports
+        netloc = host if port in (None, DEFAULT_PORTS[scheme]) else f"{host}:{port}"
+        if parts.username:
+            userinfo = parts.username + (f":{parts.password}" if parts.password else "")
+            netloc = f"{userinfo}@{netloc}"
+
+        if self.origin_only:
+            return urlunsplit((scheme, netloc, "/", "", ""))
+
+        path = parts.path or "/"
+        if self.strip_trailing_slash and len(path) > 1:
+            path = path.rstrip("/") or "/"
+
+        params = parse_qsl(parts.query, keep_blank_values=True)
+        if self.strip_tracking:
+            params = [(k, v) for k, v in params if not self.is_tracking_param(k)]
+        if self.sort_query:
+            params.sort()
+        return urlunsplit((scheme, netloc, path, urlencode(params), ""))
@@ -0,0 +1,91 @@
+# Cache warm-up client for the running API
+#
+# Sends a URL list (a file, one URL per line, and/or the N most recently
+# cached URLs) to POST /api/cache/warm, which skips entries that are already
+# fresh and analyzes the rest through the normal miss path. Progress and an
+# ETA are printed as the service reports them.
+#
+#   python warm_cache.py urls.txt                          # warm every URL in the file
+#   python warm_cache.py --recent 500                      # re-warm the 500 most recently cached URLs
+#   python warm_cache.py urls.txt --concurrency 2 --rate 1 --api http://localhost:8001
+import argparse
+import json
+import sys
+
+import httpx
+
+
+def read_urls(path):
+    """URLs from a file (or stdin for '-'), skipping blank lines and # comments"""
+    handle = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    with handle:
+        return [line.strip() for line in handle if line.strip() and not line.lstrip().startswith("#")]
+
+
+def format_eta(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def run(args):
+    payload = {"urls": read_urls(args.file) if args.file else [], "recent": args.recent, "force": args.force}
+    if args.concurrency is not None:
+        payload["concurrency"] = args.concurrency
+    if args.rate is not None:
+        payload["rate"] = args.rate
+    if not payload["urls"] and not payload["recent"]:
+        sys.exit("Nothing to warm: pass a URL file and/or --recent N")
+
+    summary = None
+    invalid = 0
+    timeout = httpx.Timeout(30, read=None)  # progress lines can be minutes apart while the analyzer works
+    with httpx.stream("POST", f"{args.api.rstrip('/')}/api/cache/warm", json=payload, timeout=timeout) as response:
+        if response.status_code != 200:
+            response.read()
+            sys.exit(f"❌ Warm-up rejected ({response.status_code}): {response.text}")
+        for line in response.iter_lines():
+            if not line:
+                continue
+            event = json.loads(line)
+            if event["event"] == "plan":
+                print(f"🔥 {event['total']} URLs: {event['skipped_fresh']} already fresh, "
+                      f"{event['rescore']} to re-score, {event['analyze']} to analyze")
+            elif event["event"] == "progress":
+                if "done" not in event:
+                    invalid += 1
+                    print(f"❌ invalid URL {event['url']}: {event['error']}")
+                    continue
+                total = event["done"] + event["remaining"]
+                status = "✅" if event["result"] != "error" else "❌"
+                detail = f" ({event['error']})" if event["result"] == "error" else ""
+                if args.quiet and event["result"] != "error" and event["done"] % 100 and event["remaining"]:
+                    continue
+                print(f"{status} [{event['done']}/{total}] {event['result']} {event['url']}{detail} "
+                      f"- ETA {format_eta(event['eta_seconds'])}")
+            elif event["event"] == "done":
+                summary = event
+
+    if summary is None:
+        sys.exit("❌ Warm-up stream ended early")
+    print(f"🏁 Done in {format_eta(summary['elapsed_seconds'])}: {summary['analyzed']} analyzed, "
+          f"{summary['rescored']} re-scored, {summary['skipped_fresh']} already fresh, {summary['error']} failed")
+    if summary["error"] or invalid:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-populate the URL cache so first visitors don't wait on the analyzer")
+    parser.add_argument("file", nargs="?", help="file with one URL per line ('-' for stdin)")
+    parser.add_argument("--recent", type=int, default=0, help="also warm the N most recently cached URLs")
+    parser.add_argument("--api", default="http://localhost:8001", help="base URL of the running API")
+    parser.add_argument("--concurrency", type=int, help="URLs analyzed in parallel (server default WARM_CONCURRENCY)")
+    parser.add_argument("--rate", type=float,
+                        help="analyzer calls started per second, 0 = unlimited (server default WARM_RATE)")
+    parser.add_argument("--force", action="store_true", help="re-analyze entries that are still fresh")
+    parser.add_argument("--quiet", action="store_true", help="only print failures and every 100th URL")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
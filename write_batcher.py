@@ -0,0 +1,72 @@
+# Groups concurrent cache writes into small bulk writes
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+
+class WriteBatcher:
+    """Collects documents written within a short window and stores them with one bulk write
+
+    write() returns once the document's group has been flushed: after
+    window seconds, or as soon as max_size documents are waiting, whichever
+    comes first. Flushes run in their own tasks, so a writer that goes
+    away does not keep its document (or anyone else's) from being stored.
+    """
+
+    def __init__(self, flush: Callable[[List[dict]], Awaitable[Dict[str, str]]],
+                 max_size: int = 50, window: float = 0.05):
+        self.flush = flush  # bulk write returning _id -> error for the documents that failed
+        self.max_size = max_size
+        self.window = window
+        self._pending: List[Tuple[dict, asyncio.Future]] = []
+        self._timer: Optional[asyncio.Task] = None
+        self._flushes: Set[asyncio.Task] = set()
+        self.flushed_groups = 0
+        self.flushed_documents = 0
+
+    @property
+    def pending(self) -> int:
+        """Documents waiting for their group to be flushed"""
+        return len(self._pending)
+
+    async def write(self, document: dict) -> Optional[str]:
+        """Queue a document for the next bulk write; returns the write error, or None once stored"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((document, future))
+        if len(self._pending) >= self.max_size:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_after_window())
+        return await asyncio.shield(future)
+
+    async def close(self):
+        """Flush whatever is still waiting and wait for running flushes"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._start_flush()
+        await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(self.window)
+        self._timer = None
+        self._start_flush()
+
+    def _start_flush(self):
+        group, self._pending = self._pending, []
+        if not group:
+            return
+        task = asyncio.create_task(self._write_group(group))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _write_group(self, group: List[Tuple[dict, asyncio.Future]]):
+        documents = [document for document, _ in group]
+        try:
+            failed = await self.flush(documents)
+        except Exception as e:
+            failed = {document["_id"]: str(e) for document in documents}
+        self.flushed_groups += 1
+        self.flushed_documents += len(documents)
+        for document, future in group:
+            if not future.done():
+                future.set_result(failed.get(document["_id"]))